@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+
+from repair import random_participants, stored_intersecting_participants, stored_grouped_participants, \
+    get_intersecting_shares
+import numpy as np
+
+
+MAX_CHOICE_TABLE_SIZE = 1 << 24
+MAX_CANDIDATE_ENTRIES = 1 << 22  # per chunk, over the candidate tables of all its trials
+
+
+class BatchTables:
+    "Array form of a design, shared by the batched repair algorithms. Row i of each table belongs to participant i."
+
+    def __init__(self, design):
+        """
+        :param design: Design to be repaired
+        """
+        self.design = design
+        self.num_participants = design.num_participants
+        sizes = design.block_sizes()
+        self.max_block_size = int(sizes.max())
+
+        self.share_mask = np.arange(self.max_block_size) < sizes[:, None]
+        self.shares = np.zeros((self.num_participants, self.max_block_size), dtype=np.int32)
+        self.shares[self.share_mask] = design.block_shares
+
+        # Algorithm 2: padded table of intersecting participants and the number of valid entries per row
+        ptr, neighbours, overlap = design.intersections()
+        self.neighbour_count = np.diff(ptr)
+        width = max(int(self.neighbour_count.max()), 1)
+        self.neighbours = np.zeros((self.num_participants, width), dtype=np.int32)
+        self.neighbours[np.arange(width) < self.neighbour_count[:, None]] = neighbours
+
+        # The scalar algorithms take the share listed first by get_intersecting_shares, which follows set iteration
+        # order. Tabulate that choice for every pair of participants sharing several shares and every set of missing
+        # shares, so the batched algorithms make the same choice. On designs too large to tabulate the first missing
+        # share is taken instead, which only matters for pairs of blocks with more than one share in common.
+        owners = np.repeat(np.arange(self.num_participants, dtype=np.int64), self.neighbour_count)
+        several = overlap > 1
+        if int(np.count_nonzero(several)) << self.max_block_size > MAX_CHOICE_TABLE_SIZE:
+            several[:] = False
+        self.choice_keys = owners[several] * self.num_participants + neighbours[several]
+        self.choices = np.zeros((len(self.choice_keys), 1 << self.max_block_size if several.any() else 0),
+                                dtype=np.int8)
+        for n, key in enumerate(self.choice_keys):
+            block, other = design.block(key // self.num_participants), design.block(key % self.num_participants)
+            for missing_bits in range(1 << len(block)):
+                missing = [s for slot, s in enumerate(block) if missing_bits >> slot & 1]
+                shares = get_intersecting_shares(missing, other)
+                self.choices[n, missing_bits] = block.index(shares[0]) if shares else -1
+
+        # Algorithm 3: number of other participants holding each share of participant i (0 for padding)
+        self.group_sizes = np.where(self.share_mask, design.replication()[self.shares] - 1, 0)
+
+
+def _check_arguments(tables, failed, p_available, fault):
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    if fault == "Transient" and p_available <= 0:
+        raise ValueError("Transient repair never terminates when p_available is 0")
+    if fault == "Transient" and np.any((tables.group_sizes[failed] == 0) & tables.share_mask[failed]):
+        raise ValueError("Transient repair never terminates when a share is held by no other participant")
+
+
+def _contact_repair(tables, failed, candidates, counts, p_available, fault, rng):
+    """
+    Shared loop of algorithms 1 and 2: each trial contacts random candidates until every share is repaired
+    :param tables: BatchTables of the design
+    :param failed: array of failed participant ids, one per trial
+    :param candidates: (trials, width) array of candidate ids, or None for every participant except the failed one
+    :param counts: number of valid candidates in each row of candidates
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param rng: numpy Generator
+    :return: bool array (whether each repair was successful) and int array (# participants contacted per repair)
+    """
+    num_trials = len(failed)
+    missing = tables.share_mask[failed].copy()
+    shares = tables.shares[failed]
+    steps = np.zeros(num_trials, dtype=np.int64)
+    success = np.zeros(num_trials, dtype=bool)
+    active = np.arange(num_trials)
+
+    while active.size:
+        # Select a random candidate for every unfinished trial
+        pick = (rng.random(active.size) * counts[active]).astype(np.int64)
+        if candidates is None:
+            P = pick + (pick >= failed[active])  # skip self without materializing the candidate table
+        else:
+            P = candidates[active, pick]
+
+        if fault == "Transient":
+            # Unavailable contacts change nothing, so jump straight to the next available one
+            steps[active] += rng.geometric(p_available, active.size)
+            contacted = active
+        else:
+            steps[active] += 1
+            available = rng.random(active.size) <= p_available
+            # Remove unavailable candidates from the trial by swapping in the last valid candidate
+            gone = active[~available]
+            last = counts[gone] - 1
+            candidates[gone, pick[~available]] = candidates[gone, last]
+            counts[gone] = last
+            contacted = active[available]
+            P = P[available]
+
+        # Request the first of the missing shares the contacted participant holds
+        hits = tables.design.holds(P[:, None], shares[contacted]) & missing[contacted]
+        slot = hits.argmax(axis=1)
+        several = np.flatnonzero(hits.sum(axis=1) > 1)
+        if several.size and tables.choice_keys.size:
+            rows = contacted[several]
+            missing_bits = missing[rows] @ (1 << np.arange(missing.shape[1]))
+            keys = failed[rows].astype(np.int64) * tables.num_participants + P[several]
+            pair = np.searchsorted(tables.choice_keys, keys)
+            slot[several] = tables.choices[pair, missing_bits]
+        has_share = hits.any(axis=1)
+        missing[contacted[has_share], slot[has_share]] = False
+
+        repaired = ~missing[active].any(axis=1)
+        success[active[repaired]] = True
+        active = active[~repaired & (counts[active] > 0)]
+
+    return success, steps
+
+
+def batch_random_participants(tables, failed, p_available, fault="Transient", rng=None):
+    """
+    Algorithm 1: Random Participants, for many independent repairs at once
+    :param tables: BatchTables of the design
+    :param failed: array of failed participant ids, one per trial
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param rng: numpy Generator, a fresh one is used if None
+    :return: bool array (whether each repair was successful) and int array (# participants contacted per repair)
+    """
+    _check_arguments(tables, failed, p_available, fault)
+    rng = np.random.default_rng() if rng is None else rng
+
+    counts = np.full(len(failed), tables.num_participants - 1, dtype=np.int64)
+    candidates = None
+    if fault == "Permanent":
+        candidates = np.arange(tables.num_participants - 1, dtype=np.int32)[None, :].repeat(len(failed), axis=0)
+        candidates += candidates >= failed[:, None]
+    return _contact_repair(tables, failed, candidates, counts, p_available, fault, rng)
+
+
+def batch_stored_intersecting_participants(tables, failed, p_available, fault="Transient", rng=None):
+    """
+    Algorithm 2: Stored Intersecting Participants, for many independent repairs at once
+    :param tables: BatchTables of the design
+    :param failed: array of failed participant ids, one per trial
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param rng: numpy Generator, a fresh one is used if None
+    :return: bool array (whether each repair was successful) and int array (# participants contacted per repair)
+    """
+    _check_arguments(tables, failed, p_available, fault)
+    rng = np.random.default_rng() if rng is None else rng
+
+    counts = tables.neighbour_count[failed].astype(np.int64)
+    candidates = tables.neighbours[failed]  # fancy indexing already gives each trial its own copy
+    return _contact_repair(tables, failed, candidates, counts, p_available, fault, rng)
+
+
+def batch_stored_grouped_participants(tables, failed, p_available, fault="Transient", rng=None):
+    """
+    Algorithm 3: Stored Grouped Participants, for many independent repairs at once.
+    Which candidate is contacted never matters here, so each share costs a geometric number of contacts,
+    truncated at the size of its group under the Permanent fault model.
+    :param tables: BatchTables of the design
+    :param failed: array of failed participant ids, one per trial
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param rng: numpy Generator, a fresh one is used if None
+    :return: bool array (whether each repair was successful) and int array (# participants contacted per repair)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    if fault == "Transient" and p_available <= 0:
+        raise ValueError("Transient repair never terminates when p_available is 0")
+    rng = np.random.default_rng() if rng is None else rng
+
+    sizes = tables.group_sizes[failed]
+    share_mask = tables.share_mask[failed]
+    if p_available > 0:
+        tries = rng.geometric(min(p_available, 1), sizes.shape)
+    else:
+        tries = np.full(sizes.shape, np.iinfo(np.int64).max)
+
+    if fault == "Transient":
+        share_failed = share_mask & (sizes == 0)  # the scalar loop gives up at once on an empty group
+        share_steps = np.where(share_failed, 0, tries)
+    else:
+        share_failed = share_mask & (tries > sizes)
+        share_steps = np.minimum(tries, sizes)
+    share_steps = np.where(share_mask, share_steps, 0)
+
+    # Shares are repaired in order, so a repair stops at its first failed share
+    success = ~share_failed.any(axis=1)
+    last = np.where(success, share_steps.shape[1] - 1, share_failed.argmax(axis=1))
+    steps = np.cumsum(share_steps, axis=1)[np.arange(len(failed)), last]
+    return success, steps
+
+
+BATCH_ALGORITHMS = {
+    random_participants: batch_random_participants,
+    stored_intersecting_participants: batch_stored_intersecting_participants,
+    stored_grouped_participants: batch_stored_grouped_participants,
+}
+
+
+def simulate_repairs(tables, batch_algorithm, p_available, fault, num_iterations, rng=None, chunk_size=65536):
+    """
+    Run num_iterations repairs of uniformly chosen failed participants, chunk_size trials at a time
+    :param tables: BatchTables of the design
+    :param batch_algorithm: one of the batch_* repair algorithms
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param num_iterations: total number of repairs
+    :param rng: numpy Generator, a fresh one is used if None
+    :param chunk_size: maximum number of repairs simulated together, bounds the memory used
+    :return: generator of (success, steps) array pairs, one per chunk
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    # Algorithm 2, and algorithm 1 under the Permanent fault model, give every trial its own copy of a candidate
+    # table: keep the tables of a chunk to a few million entries
+    width = None
+    if batch_algorithm is batch_random_participants and fault == "Permanent":
+        width = tables.num_participants
+    elif batch_algorithm is batch_stored_intersecting_participants:
+        width = tables.neighbours.shape[1]
+    if width is not None:
+        chunk_size = max(1, min(chunk_size, MAX_CANDIDATE_ENTRIES // width))
+
+    done = 0
+    while done < num_iterations:
+        n = min(chunk_size, num_iterations - done)
+        failed = rng.integers(0, tables.num_participants, n)
+        yield batch_algorithm(tables, failed, p_available, fault, rng)
+        done += n
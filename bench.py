@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+from experiment import DESIGNS, repair_algos_list, fault_models_list, init_intersecting_participants, \
+    init_grouped_participants
+from design import Design
+from design_library import projective_plane, steiner_triple_system, design_parameters
+from participant import Participant
+
+import argparse
+import json
+import os
+import platform
+import random as r
+import statistics
+import sys
+import time
+import numpy as np
+
+BENCH_PROBABILITY = 0.9
+REGRESSION_THRESHOLD = 0.2  # relative slowdown of the median flagged as a regression
+
+
+def machine_metadata():
+    """
+    :return: dict describing the machine and software the benchmarks ran on
+    """
+    return {"platform": platform.platform(), "machine": platform.machine(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count(), "python": platform.python_version(), "numpy": np.__version__,
+            "timer_resolution_ns": time.get_clock_info("perf_counter").resolution * 1e9,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def time_calls(function, make_args, repeats=5, min_batch_ns=20000000):
+    """
+    Time a function by batches of calls, so the timer resolution and overhead are spread over the whole batch. The
+    batch size doubles until a batch takes min_batch_ns, that calibration doubling as the warmup, then repeats
+    batches of that size are timed.
+    :param function: function to time
+    :param make_args: function returning the argument tuple of one call, made before the batch and not timed
+    :param repeats: number of timed batches
+    :param min_batch_ns: shortest batch duration, in nanoseconds
+    :return: list of the average nanoseconds per call of every timed batch, and the batch size
+    """
+    def run_batch(size):
+        args = [make_args() for _ in range(size)]
+        start = time.perf_counter_ns()
+        for a in args:
+            function(*a)
+        return time.perf_counter_ns() - start
+
+    batch_size = 1
+    while run_batch(batch_size) < min_batch_ns:
+        batch_size *= 2
+    return [run_batch(batch_size) / batch_size for _ in range(repeats)], batch_size
+
+
+def bench_designs(include_large=True):
+    """
+    :param include_large: also add larger designs from the design library
+    :return: dict of design name -> Design, by increasing size
+    """
+    designs = {name: Design(blocks) for name, blocks in DESIGNS.items()}
+    if include_large:
+        for design in [projective_plane(11), projective_plane(23), steiner_triple_system(99)]:
+            designs.update({design_parameters(design): design})
+    return designs
+
+
+def bench_design(name, design, repeats=5, min_batch_ns=20000000):
+    """
+    Benchmark the repair algorithms and the init functions on one design
+    :return: list of result records
+    """
+    v, b, replication, k, _ = (int(x) for x in design_parameters(design).split(","))
+    base = {"design": name, "v": v, "b": b, "r": replication, "k": k}
+    records = []
+
+    def record(benchmark, function, make_args, **fields):
+        samples, batch_size = time_calls(function, make_args, repeats, min_batch_ns)
+        entry = dict(base, benchmark=benchmark, **fields)
+        entry.update({"median_ns": statistics.median(samples), "min_ns": min(samples), "max_ns": max(samples),
+                      "batch_size": batch_size, "repeats": repeats})
+        records.append(entry)
+
+    blocks = design.blocks()
+    for init in [init_intersecting_participants, init_grouped_participants]:
+        record(init.__name__, init, lambda: ({i: Participant(i, block) for i, block in enumerate(blocks)},))
+
+    store = design.participant_store()
+    np.random.seed(0)
+    r.seed(0)
+    for repair_algo in repair_algos_list:
+        for fault_model in fault_models_list:
+            def repair(failed):
+                repair_algo(store, store.new_trial(failed), BENCH_PROBABILITY, fault_model)
+
+            record("repair", repair, lambda: (r.randrange(design.num_participants),),
+                   algorithm=repair_algo.__name__, fault=fault_model, p=BENCH_PROBABILITY)
+    return records
+
+
+def _key(record):
+    return record["benchmark"], record["design"], record.get("algorithm"), record.get("fault"), record.get("p")
+
+
+def compare(records, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Flag the benchmarks whose median got slower than threshold relative to the baseline
+    :param records: result records of this run
+    :param baseline: result records of the baseline run
+    :return: list of (record, baseline median) of the regressions
+    """
+    previous = {_key(record): record["median_ns"] for record in baseline}
+    regressions = []
+    for record in records:
+        before = previous.get(_key(record))
+        record.update({"baseline_ns": before})
+        if before is not None and record["median_ns"] > before * (1 + threshold):
+            regressions.append((record, before))
+    return regressions
+
+
+def print_records(records):
+    print("%-22s %-34s %-9s %12s %12s %12s" % ("design", "benchmark", "fault", "median us", "min us", "baseline us"))
+    for record in records:
+        benchmark = record.get("algorithm", record["benchmark"])
+        baseline = "" if record.get("baseline_ns") is None else "%.2f" % (record["baseline_ns"] / 1000)
+        print("%-22s %-34s %-9s %12.2f %12.2f %12s" % (record["design"], benchmark, record.get("fault", ""),
+                                                         record["median_ns"] / 1000, record["min_ns"] / 1000,
+                                                         baseline))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the repair algorithms and the participant init functions")
+    parser.add_argument("--output", help="write the results and machine metadata to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to flag regressions against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown of the median flagged as a regression")
+    parser.add_argument("--repeats", type=int, default=5, help="number of timed batches per benchmark")
+    parser.add_argument("--min-batch-ms", type=float, default=20, help="shortest duration of a timed batch")
+    parser.add_argument("--small", action="store_true", help="only the designs of experiment.py")
+    args = parser.parse_args()
+
+    results = []
+    for design_name, bench in bench_designs(not args.small).items():
+        results.extend(bench_design(design_name, bench, args.repeats, int(args.min_batch_ms * 1e6)))
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f)["results"], args.threshold)
+    print_records(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": machine_metadata(), "results": results}, f, indent=1)
+
+    for result, baseline_ns in regressed:
+        print("REGRESSION %s %s %s: %.2f us, baseline %.2f us" % (result["design"],
+                                                                 result.get("algorithm", result["benchmark"]),
+                                                                 result.get("fault", ""), result["median_ns"] / 1000,
+                                                                 baseline_ns / 1000))
+    sys.exit(1 if regressed else 0)
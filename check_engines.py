@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+from experiment import DESIGNS, evaluate_design, evaluate_design_batch, evaluate_design_exact
+from batch_repair import BATCH_ALGORITHMS
+from exact import EXACT_ALGORITHMS
+
+import argparse
+import math
+import random as r
+import sys
+import numpy as np
+
+CHECK_DESIGNS = ["7,7,3,3,1", "13,13,4,4,1"]
+CHECK_PROBS = [1, 0.9, 0.7, 0.5, 0.3]
+CHECK_FAULTS = ["Permanent", "Transient"]
+Z_THRESHOLD = 5  # standard errors a simulated estimate may be off the exact value before it is flagged
+
+
+def exact_values(row):
+    """
+    :param row: result row of evaluate_design_exact
+    :return: success probability, success average and variance, fail average and variance of participants contacted
+    """
+    return (row['Success probability'], row['Success average contacted'], row['Success contacted variance'],
+            row['Fail average contacted'], row['Fail contacted variance'])
+
+
+def mismatches(exact_row, row, num_iterations, z=Z_THRESHOLD):
+    """
+    Compare the simulated result row of a configuration with its exact one, each estimate against the standard error
+    the exact distribution gives it
+    :param exact_row: result row of evaluate_design_exact
+    :param row: result row of evaluate_design or evaluate_design_batch for the same configuration
+    :param num_iterations: number of simulated repairs of row
+    :param z: number of standard errors tolerated
+    :return: list of (quantity, simulated, exact, standard error) off by more than z standard errors
+    """
+    p, success_mean, success_variance, fail_mean, fail_variance = exact_values(exact_row)
+    successes = row['Successful repairs']
+    failures = row['Failed repairs']
+    checks = [("success rate", successes / num_iterations, p, math.sqrt(max(p * (1 - p), 0) / num_iterations))]
+    if successes:
+        checks.append(("success average contacted", row['Success average contacted'], success_mean,
+                       math.sqrt(max(success_variance, 0) / successes)))
+    if failures:
+        checks.append(("fail average contacted", row['Fail average contacted'], fail_mean,
+                       math.sqrt(max(fail_variance, 0) / failures)))
+    # The exact values are sums of floats: the 1e-9 floor keeps the cells without variance from failing on rounding
+    return [(quantity, simulated, expected, error) for quantity, simulated, expected, error in checks
+            if abs(simulated - expected) > z * error + 1e-9]
+
+
+def check_design(name, num_iterations, scalar_iterations, seed):
+    """
+    Evaluate a design of experiment.py exactly and with the batch and scalar engines, and compare them
+    :return: list of the failed comparisons, as (engine, algorithm, fault model, probability, mismatch)
+    """
+    algorithms = [algorithm for algorithm in EXACT_ALGORITHMS if algorithm in BATCH_ALGORITHMS]
+    blocks = DESIGNS[name]
+    exact = evaluate_design_exact(blocks, CHECK_PROBS, CHECK_FAULTS, num_iterations, algorithms)
+    simulated = {"batch": (evaluate_design_batch(blocks, CHECK_PROBS, CHECK_FAULTS, num_iterations, algorithms,
+                                                 np.random.default_rng(seed)), num_iterations)}
+    if scalar_iterations:
+        r.seed(seed)
+        np.random.seed(seed)
+        simulated.update({"scalar": (evaluate_design(blocks, CHECK_PROBS, CHECK_FAULTS, scalar_iterations,
+                                                     algorithms), scalar_iterations)})
+
+    failed = []
+    key = ['Algorithm', 'Fault model', 'Availability probability']
+    for engine, (results, iterations) in simulated.items():
+        rows = {tuple(row[key]): row for _, row in results.iterrows()}
+        for _, exact_row in exact.iterrows():
+            for mismatch in mismatches(exact_row, rows[tuple(exact_row[key])], iterations):
+                failed.append((engine, *exact_row[key], mismatch))
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the batch and scalar engines against the exact solver on "
+                                                 "small designs, exiting with status 1 on any mismatch")
+    parser.add_argument("--iterations", type=int, default=100000, help="repairs per configuration of the batch engine")
+    parser.add_argument("--scalar-iterations", type=int, default=2000,
+                        help="repairs per configuration of the scalar engine, 0 to skip it")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--designs", nargs="+", default=CHECK_DESIGNS, choices=list(DESIGNS),
+                        help="designs of experiment.py to check")
+    args = parser.parse_args()
+
+    failures = []
+    for design_name in args.designs:
+        design_failures = check_design(design_name, args.iterations, args.scalar_iterations, args.seed)
+        print("%-14s %s" % (design_name, "%d mismatches" % len(design_failures) if design_failures else "ok"))
+        failures.extend((design_name, *failure) for failure in design_failures)
+
+    for design_name, engine, algorithm, fault, prob, (quantity, simulated, expected, error) in failures:
+        print("MISMATCH %s %s %s %s %s: %s %.6g, exact %.6g (standard error %.3g)" %
+              (design_name, engine, algorithm, fault, prob, quantity, simulated, expected, error))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+
+import base64
+import json
+import os
+import random
+import numpy as np
+
+
+def _pack(words):
+    return base64.b64encode(np.asarray(words, dtype=np.uint32).tobytes()).decode("ascii")
+
+
+def _unpack(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.uint32)
+
+
+def global_rng_state():
+    """
+    :return: JSON-serializable state of the random module and of the global numpy generator, used by evaluate_design
+    """
+    version, internal, gauss_next = random.getstate()
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {"random": [version, _pack(internal), gauss_next],
+            "numpy": [name, _pack(keys), int(pos), int(has_gauss), float(cached_gaussian)]}
+
+
+def set_global_rng_state(state):
+    """
+    :param state: state returned by global_rng_state
+    """
+    version, internal, gauss_next = state["random"]
+    random.setstate((version, tuple(_unpack(internal).tolist()), gauss_next))
+    name, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((name, _unpack(keys), pos, has_gauss, cached_gaussian))
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Cannot write %r to a checkpoint" % (value,))
+
+
+class CheckpointLog:
+    """
+    Append-only log of the finished (algorithm, fault model, availability probability) cells of a run, one JSON line
+    per cell with its result row and the RNG state right after it. The first line holds the run's configuration, so a
+    log is never resumed with different settings. Cells run in order, so the finished cells are a prefix of the run:
+    resuming replays their rows, restores the last RNG state and carries on with the next cell, drawing the same
+    random numbers as a run that was never interrupted.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: log file, created by start if missing
+        """
+        self.path = path
+        self.config = None
+        self.entries = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            records = []
+            for line in text.splitlines():
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # the run died while writing this line, the cell will run again
+            if len(records) != text.count("\n"):
+                # Drop the torn line, so the next record starts on a line of its own
+                with open(path, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+            if records:
+                self.config = records[0]["config"]
+                self.entries = records[1:]
+
+    def start(self, config):
+        """
+        Check the log belongs to this run, writing its header if the log is new
+        :param config: JSON-serializable dict of the run settings
+        :return: list of the result rows of the finished cells, in order
+        """
+        config = json.loads(json.dumps(config, default=_json_default))
+        if self.config is None:
+            self.config = config
+            self.entries = []
+            self._write({"config": config}, "w")
+        elif self.config != config:
+            raise ValueError("Checkpoint %s was written by a run with different settings, remove it to start over"
+                             % self.path)
+        return [entry["row"] for entry in self.entries]
+
+    def finished(self, cell):
+        """
+        :param cell: tuple (algorithm name, fault model, availability probability)
+        :return: whether the cell is already in the log
+        """
+        return any(tuple(entry["cell"]) == tuple(cell) for entry in self.entries)
+
+    def last_state(self):
+        """
+        :return: the RNG state saved after the last finished cell, None if no cell is finished
+        """
+        return self.entries[-1]["state"] if self.entries else None
+
+    def record(self, cell, row, state):
+        """
+        Append a finished cell, forced to disk before returning
+        :param cell: tuple (algorithm name, fault model, availability probability)
+        :param row: its result row
+        :param state: JSON-serializable RNG state after the cell
+        """
+        entry = json.loads(json.dumps({"cell": list(cell), "row": row, "state": state}, default=_json_default))
+        self._write(entry, "a")
+        self.entries.append(entry)
+
+    def discard(self):
+        "Delete the log once its run is finished, so a later run starts over instead of replaying the old rows"
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.config = None
+        self.entries = []
+
+    def _write(self, record, mode):
+        with open(self.path, mode, encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":"), default=_json_default) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
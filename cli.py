@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+
+# Only the standard library is imported here: numpy and the evaluation modules are imported once the arguments are
+# parsed, so --help, --list and argument errors come back at once
+
+import argparse
+import json
+import os
+import sys
+
+ENGINES = ["scalar", "batch", "exact", "sweep"]
+
+# Settings of a run, in the order they are overridden: these defaults, the config file, the command line flags.
+# probs, faults, algorithms and iterations left as None take the values of experiment.py.
+DEFAULT_SETTINGS = {"designs": [], "builtin": [], "generate": [], "probs": None, "faults": None,
+                    "algorithms": None, "iterations": None, "engine": "scalar", "output_dir": ".", "seed": None,
+                    "workers": None, "distributions": False, "tolerance": None, "confidence": 0.95,
+                    "checkpoint": False, "instrument": False, "availability_concentration": None}
+
+
+def read_blocks(path):
+    """
+    Read a design from a block-list file: one block per line, given as share ids separated by spaces or commas.
+    Blank lines and everything after a # are ignored.
+    :param path: block-list file
+    :return: list of blocks
+    """
+    blocks = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].replace(",", " ").strip()
+            if not line:
+                continue
+            try:
+                blocks.append([int(share) for share in line.split()])
+            except ValueError:
+                raise ValueError("%s:%d: expected share ids, got %r" % (path, number, line))
+    if not blocks:
+        raise ValueError("%s has no blocks" % path)
+    return blocks
+
+
+def parse_generate(spec):
+    """
+    :param spec: "family:param,param" with integer parameters, e.g. "steiner_triple:99", followed for the cyclic
+    family by its base blocks as further ":share,share" groups, e.g. "cyclic:13:0,1,3,9", or a list [family, *params]
+    as written in a config file
+    :return: family name and list of generator parameters
+    """
+    if isinstance(spec, list):
+        return spec[0], spec[1:]
+    family, *groups = spec.split(":")
+    try:
+        groups = [[int(param) for param in group.split(",") if param] for group in groups]
+    except ValueError:
+        raise ValueError("Bad design %r, expected family:param,param with integer parameters" % spec)
+    params = groups[0] if groups else []
+    if len(groups) > 1:
+        params.append(groups[1:])
+    return family, params
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Evaluate the repair algorithms of repairable threshold schemes on a grid of availability "
+                    "probabilities, fault models and algorithms. Each design gets its <name>-BIBD_results.csv.")
+    parser.add_argument("designs", nargs="*", metavar="DESIGN_FILE",
+                        help="block-list file: one block of share ids per line, named after the file")
+    parser.add_argument("-b", "--builtin", nargs="+", metavar="NAME",
+                        help='designs of experiment.py by name, e.g. "7,7,3,3,1", or all of them with "all"')
+    parser.add_argument("-g", "--generate", nargs="+", metavar="FAMILY:PARAMS",
+                        help="designs of the design library, e.g. projective_plane:5, steiner_triple:99 or "
+                             "cyclic:13:0,1,3,9 (base blocks as further :groups), cached on disk")
+    parser.add_argument("-c", "--config", help="JSON file of settings named as the long options, e.g. "
+                                               '{"probs": [0.9, 0.5], "designs": ["plane.txt"]}; flags override it')
+    parser.add_argument("-p", "--probs", nargs="+", type=float, metavar="P", help="availability probabilities")
+    parser.add_argument("-f", "--faults", nargs="+", choices=["Permanent", "Transient"], help="fault models")
+    parser.add_argument("-a", "--algorithms", nargs="+", metavar="NAME", help="repair algorithms, see --list")
+    parser.add_argument("-n", "--iterations", type=int, help="repairs per configuration")
+    parser.add_argument("-e", "--engine", choices=ENGINES,
+                        help="scalar: evaluate_design (default), batch: evaluate_design_batch, exact: "
+                             "evaluate_design_exact, sweep: run_sweep over a process pool")
+    parser.add_argument("-o", "--output-dir", help="directory of the result files, default the current one")
+    parser.add_argument("--seed", type=int, help="random seed, for reproducible runs")
+    parser.add_argument("--workers", type=int, help="number of processes of the sweep engine")
+    parser.add_argument("--distributions", action="store_true", default=None,
+                        help="also record the distribution of participants contacted")
+    parser.add_argument("--tolerance", type=float,
+                        help="stop a configuration once the confidence intervals are this narrow, with "
+                             "--iterations as the cap (scalar and batch engines)")
+    parser.add_argument("--confidence", type=float, help="confidence level used with --tolerance")
+    parser.add_argument("--checkpoint", action="store_true", default=None,
+                        help="keep finished configurations in <name>-BIBD_results.checkpoint until the design is done, "
+                             "and resume an interrupted run from it (scalar and batch engines)")
+    parser.add_argument("--instrument", action="store_true", default=None,
+                        help="write an instrumentation breakdown and a cProfile dump next to each result file "
+                             "(scalar engine)")
+    parser.add_argument("--availability-concentration", type=float, metavar="C",
+                        help="give every participant its own availability, Beta distributed around each probability "
+                             "with concentration C, the lower the more they differ (scalar engine)")
+    parser.add_argument("--list", action="store_true", help="list the algorithms, designs and design families")
+    return parser
+
+
+def load_settings(args):
+    """
+    :param args: parsed command line arguments
+    :return: dict of the settings of the run
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        unknown = set(config) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError("Unknown settings in %s: %s" % (args.config, ", ".join(sorted(unknown))))
+        settings.update(config)
+    settings.update({name: value for name, value in vars(args).items()
+                     if name in DEFAULT_SETTINGS and value is not None and value != []})
+    return settings
+
+
+def load_designs(settings):
+    """
+    :param settings: settings of the run
+    :return: dict of design name -> blocks, or Design for the generated designs, which are memory-mapped from the
+    cache and passed to the engines as they are
+    """
+    designs = {}
+    for path in settings["designs"]:
+        designs.update({os.path.splitext(os.path.basename(path))[0]: read_blocks(path)})
+
+    if settings["builtin"]:
+        from experiment import DESIGNS
+        names = list(DESIGNS) if "all" in settings["builtin"] else settings["builtin"]
+        for name in names:
+            if name not in DESIGNS:
+                raise ValueError("Unknown design %s, expected one of %s" % (name, ", ".join(DESIGNS)))
+            designs.update({name: DESIGNS[name]})
+
+    if settings["generate"]:
+        from design_library import cached_design, design_parameters
+        for spec in settings["generate"]:
+            family, params = parse_generate(spec)
+            design = cached_design(family, *params)
+            designs.update({design_parameters(design): design})
+
+    if not designs:
+        raise ValueError("No design given: pass block-list files, --builtin or --generate")
+    return designs
+
+
+def select_algorithms(names, engine):
+    """
+    :param names: repair algorithm names, None for the repair_algos_list of experiment.py
+    :param engine: one of ENGINES
+    :return: list of repair algorithms
+    """
+    from experiment import REPAIR_ALGORITHMS, repair_algos_list
+    if names is None:
+        return list(repair_algos_list)
+    algorithms = []
+    for name in names:
+        if name not in REPAIR_ALGORITHMS:
+            raise ValueError("Unknown algorithm %s, expected one of %s" % (name, ", ".join(REPAIR_ALGORITHMS)))
+        algorithms.append(REPAIR_ALGORITHMS[name])
+
+    if engine != "scalar":
+        if engine == "exact":
+            from exact import EXACT_ALGORITHMS as supported
+        else:
+            from batch_repair import BATCH_ALGORITHMS as supported
+        unsupported = [algorithm.__name__ for algorithm in algorithms if algorithm not in supported]
+        if unsupported:
+            raise ValueError("The %s engine cannot run %s" % (engine, ", ".join(unsupported)))
+    return algorithms
+
+
+def check_options(settings):
+    engine = settings["engine"]
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine %s, expected one of %s" % (engine, ", ".join(ENGINES)))
+    options = [("tolerance", ["scalar", "batch"]), ("checkpoint", ["scalar", "batch"]),
+               ("instrument", ["scalar"]), ("availability_concentration", ["scalar"]),
+               ("distributions", ["scalar", "batch", "sweep"]), ("workers", ["sweep"])]
+    for option, engines in options:
+        if settings[option] not in (None, False) and engine not in engines:
+            raise ValueError("--%s does not apply to the %s engine" % (option.replace("_", "-"), engine))
+
+
+def run(settings, designs, algorithms):
+    """
+    Evaluate every design on the grid of the settings, writing one CSV file per design
+    :param settings: settings of the run
+    :param designs: dict of design name -> blocks or Design
+    :param algorithms: list of repair algorithms
+    """
+    import experiment
+    from checkpoint import CheckpointLog
+    from results import ResultsSink
+    import instrumentation
+
+    engine = settings["engine"]
+    probs = experiment.avail_probs if settings["probs"] is None else settings["probs"]
+    faults = experiment.fault_models_list if settings["faults"] is None else settings["faults"]
+    num_iterations = experiment.num_repair_iterations if settings["iterations"] is None else settings["iterations"]
+    distributions = settings["distributions"]
+    tolerance = settings["tolerance"]
+    seed = settings["seed"]
+
+    output_dir = settings["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    def path(name, extension):
+        return os.path.join(output_dir, name + "-BIBD_results" + extension)
+
+    if engine == "sweep":
+        from sweep import run_sweep
+        print("Evaluating %s..." % ", ".join(designs))
+        sinks = {name: ResultsSink(experiment.result_columns(distributions), path(name, ".csv")) for name in designs}
+        run_sweep(designs, probs, faults, num_iterations, algorithms, 0 if seed is None else seed,
+                  settings["workers"], sinks=sinks, distributions=distributions)
+        for sink in sinks.values():
+            sink.close()
+        print("Done.")
+        return
+
+    import numpy as np
+    if engine == "scalar" and seed is not None:
+        import random
+        random.seed(seed)
+        np.random.seed(seed)
+    rng = np.random.default_rng(seed)
+    instrumentation.enable(settings["instrument"])
+
+    for name, blocks in designs.items():
+        print("Evaluating %s..." % name)
+        checkpoint = CheckpointLog(path(name, ".checkpoint")) if settings["checkpoint"] else None
+        if engine == "exact":
+            columns = experiment.RESULT_COLUMNS + experiment.EXACT_COLUMNS
+        else:
+            columns = experiment.result_columns(distributions, tolerance is not None)
+        with ResultsSink(columns, path(name, ".csv")) as sink, \
+                instrumentation.profiled(path(name, ".prof") if settings["instrument"] else None):
+            if engine == "scalar":
+                experiment.evaluate_design(blocks, probs, faults, num_iterations, algorithms, sink, distributions,
+                                           tolerance, confidence=settings["confidence"], checkpoint=checkpoint,
+                                           availability_concentration=settings["availability_concentration"],
+                                           availability_seed=0 if seed is None else seed)
+            elif engine == "batch":
+                experiment.evaluate_design_batch(blocks, probs, faults, num_iterations, algorithms, rng, sink,
+                                                 distributions, tolerance, confidence=settings["confidence"],
+                                                 checkpoint=checkpoint)
+            else:
+                experiment.evaluate_design_exact(blocks, probs, faults, num_iterations, algorithms, sink)
+        if checkpoint is not None:
+            checkpoint.discard()
+        if settings["instrument"]:
+            instrumentation.write_breakdown(path(name, ".instrumentation.csv"))
+        print("Done.")
+
+
+def print_catalogue():
+    from experiment import DESIGNS, REPAIR_ALGORITHMS
+    from batch_repair import BATCH_ALGORITHMS
+    from exact import EXACT_ALGORITHMS
+    from design_library import GENERATORS
+
+    print("Algorithms (engines):")
+    for name, algorithm in REPAIR_ALGORITHMS.items():
+        engines = ["scalar"] + (["batch", "sweep"] if algorithm in BATCH_ALGORITHMS else []) + \
+                  (["exact"] if algorithm in EXACT_ALGORITHMS else [])
+        print("  %-34s %s" % (name, ", ".join(engines)))
+    print("Built-in designs:")
+    for name in DESIGNS:
+        print("  " + name)
+    print("Design families:")
+    for family in GENERATORS:
+        print("  " + family)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.list:
+        print_catalogue()
+        return 0
+    try:
+        settings = load_settings(args)
+        check_options(settings)
+        designs = load_designs(settings)
+        algorithms = select_algorithms(settings["algorithms"], settings["engine"])
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    run(settings, designs, algorithms)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+#!/usr/bin/python3
+
+from repair import get_intersecting_shares, random_participants, stored_intersecting_participants, \
+    stored_grouped_participants
+from design import Design
+from results import ResultsSink
+
+import asyncio
+import selectors
+import numpy as np
+
+CONCURRENT_COLUMNS = ['Algorithm', 'Fault model', 'Availability probability', 'Failures per burst', 'Bursts',
+                      'Successful repairs', 'Failed repairs', 'Average makespan', 'Max makespan', 'Throughput',
+                      'Average repair time', 'Average contacted', 'Average helper load', 'Max helper load',
+                      'Max helper utilisation']
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    "Selector that never blocks: instead of waiting for the next timer, it moves the loop's virtual clock to it."
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # Nothing is ready or scheduled, so waiting would never end
+            raise RuntimeError("Simulation deadlocked: no event left to wait for")
+        if timeout > 0:
+            self.loop.virtual_time += timeout
+        return super().select(0)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop running on simulated time: asyncio.sleep and every other timer return at once, with loop.time() moved
+    forward to their deadline. Coroutines run in the same order as on the real clock, so a simulation takes as long as
+    the events it processes, however many simulated seconds they span.
+    """
+
+    def __init__(self):
+        self.virtual_time = 0.0
+        super().__init__(selector=_VirtualSelector(self))
+
+    def time(self):
+        return self.virtual_time
+
+
+def constant_latency(seconds):
+    """
+    :return: latency distribution always taking seconds
+    """
+    return lambda rng: seconds
+
+
+def exponential_latency(mean):
+    """
+    :return: exponentially distributed latency with the given mean, in seconds
+    """
+    return lambda rng: rng.exponential(mean)
+
+
+def lognormal_latency(median, sigma):
+    """
+    :return: log-normally distributed latency with the given median, in seconds, and shape sigma
+    """
+    return lambda rng: median * rng.lognormal(0.0, sigma)
+
+
+class _Burst:
+    "Participant pool shared by the concurrent repairs of one burst of failures."
+
+    def __init__(self, design, failed, p_available, fault, latency, helper_capacity, contact_timeout, down_until, rng,
+                 max_contacts):
+        self.design = design
+        self.failed = set(failed)
+        self.p_available = p_available
+        self.permanent = fault == "Permanent"
+        self.latency = latency
+        self.helper_capacity = helper_capacity
+        self.contact_timeout = contact_timeout
+        self.down_until = down_until
+        self.rng = rng
+        self.max_contacts = max_contacts
+
+        # Shares held only by failed participants are lost, no strategy can repair them
+        self.replication = design.replication()
+        holders_failed = np.zeros(design.num_shares, dtype=np.int64)
+        for i in self.failed:
+            holders_failed[design.block(i)] += 1
+        self.lost_shares = holders_failed == self.replication
+
+        self.semaphores = {}
+        self.served = np.zeros(design.num_participants, dtype=np.int64)
+        self.busy_time = np.zeros(design.num_participants)
+
+    async def contact(self, helper):
+        """
+        Ask a helper for its shares. A failed helper, one in an outage or one unavailable this time does not answer,
+        and the request times out; otherwise it waits for one of the helper's helper_capacity slots and answers after
+        a sampled latency.
+        :param helper: participant id
+        :return: whether the helper answered
+        """
+        now = asyncio.get_running_loop().time()
+        if helper in self.failed or now < self.down_until[helper] or self.rng.random() > self.p_available:
+            await asyncio.sleep(self.contact_timeout)
+            return False
+        if helper not in self.semaphores:
+            self.semaphores.update({helper: asyncio.Semaphore(self.helper_capacity)})
+        async with self.semaphores[helper]:
+            latency = self.latency(self.rng)
+            await asyncio.sleep(latency)
+        self.served[helper] += 1
+        self.busy_time[helper] += latency
+        return True
+
+    def lost(self, failed):
+        """
+        :param failed: id of a failed participant
+        :return: whether one of its shares is lost, so its repair fails without contacting anyone
+        """
+        return bool(self.lost_shares[self.design.block(failed)].any())
+
+
+async def _contact_repair(burst, failed, candidates):
+    # Algorithms 1 and 2: contact random candidates until every share of the failed participant is repaired
+    if burst.lost(failed):
+        return False, 0
+    missing_shares = burst.design.block(failed)
+    # Every other holder of a missing share is a candidate, the repair fails once one of them has none left
+    holders_left = {s: int(burst.replication[s]) - 1 for s in missing_shares}
+    live = len(candidates)
+    contacts = 0
+    while live and contacts < burst.max_contacts:
+        j = int(burst.rng.integers(live))
+        helper = candidates[j]
+        contacts += 1
+        if not await burst.contact(helper):
+            if burst.permanent:
+                live -= 1
+                candidates[j] = candidates[live]
+                for s in burst.design.block(helper):
+                    if s in holders_left:
+                        holders_left[s] -= 1
+                        if not holders_left[s]:
+                            return False, contacts
+            continue
+
+        shares = get_intersecting_shares(missing_shares, burst.design.block(helper))
+        if shares:
+            missing_shares.remove(shares[0])
+            holders_left.pop(shares[0])
+        if not missing_shares:
+            return True, contacts
+    return False, contacts
+
+
+async def concurrent_random_participants(burst, failed):
+    """
+    Algorithm 1: Random Participants, contacting over the simulated network
+    :param burst: _Burst the repair runs in
+    :param failed: id of the participant to repair
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    candidates = [i for i in range(burst.design.num_participants) if i != failed]
+    return await _contact_repair(burst, failed, candidates)
+
+
+async def concurrent_stored_intersecting_participants(burst, failed):
+    """
+    Algorithm 2: Stored Intersecting Participants, contacting over the simulated network
+    :param burst: _Burst the repair runs in
+    :param failed: id of the participant to repair
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    return await _contact_repair(burst, failed, burst.design.intersecting_participants(failed))
+
+
+async def concurrent_stored_grouped_participants(burst, failed):
+    """
+    Algorithm 3: Stored Grouped Participants, contacting over the simulated network
+    :param burst: _Burst the repair runs in
+    :param failed: id of the participant to repair
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    if burst.lost(failed):
+        return False, 0
+    contacts = 0
+    for s, candidates in burst.design.grouped_participants(failed).items():
+        repaired = False
+        live = len(candidates)
+        while not repaired and live and contacts < burst.max_contacts:
+            j = int(burst.rng.integers(live))
+            contacts += 1
+            if await burst.contact(candidates[j]):
+                repaired = True
+            elif burst.permanent:
+                live -= 1
+                candidates[j] = candidates[live]
+
+        if not repaired:
+            return False, contacts
+
+    return True, contacts
+
+
+CONCURRENT_ALGORITHMS = {
+    random_participants: concurrent_random_participants,
+    stored_intersecting_participants: concurrent_stored_intersecting_participants,
+    stored_grouped_participants: concurrent_stored_grouped_participants,
+}
+
+
+def outages(num_participants, rack_size, outage_probability, outage_duration, rng):
+    """
+    Correlated outages: participants are split into racks of rack_size consecutive ids, and each rack independently
+    goes down at the start of the burst with outage_probability, for an exponentially distributed time
+    :param outage_duration: mean outage duration, in seconds
+    :return: array of the time until which each participant is down
+    """
+    num_racks = -(-num_participants // rack_size)
+    down = rng.random(num_racks) < outage_probability
+    until = np.where(down, rng.exponential(outage_duration, num_racks), 0.0)
+    return np.repeat(until, rack_size)[:num_participants]
+
+
+def simulate_burst(design, concurrent_algorithm, num_failures, p_available, fault, latency, helper_capacity=1,
+                   contact_timeout=1.0, rack_size=1, outage_probability=0.0, outage_duration=10.0, rng=None,
+                   max_contacts=100000):
+    """
+    Fail num_failures distinct random participants at once and repair them all concurrently
+    :param design: Design
+    :param concurrent_algorithm: one of the CONCURRENT_ALGORITHMS values
+    :param latency: function of a numpy Generator returning the latency of an answered contact, in seconds
+    :param helper_capacity: number of requests a helper serves at the same time, the others queue
+    :param contact_timeout: time spent on a helper that does not answer, in seconds
+    :param max_contacts: contacts after which a repair gives up, so repairs always end
+    :return: list of (success, contacts, finish time) per repair, and the _Burst with the helper loads
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    rng = np.random.default_rng() if rng is None else rng
+    failed = rng.choice(design.num_participants, num_failures, replace=False).tolist()
+    down_until = outages(design.num_participants, rack_size, outage_probability, outage_duration, rng)
+    burst = _Burst(design, failed, p_available, fault, latency, helper_capacity, contact_timeout, down_until, rng,
+                   max_contacts)
+
+    async def repair(participant):
+        success, contacts = await concurrent_algorithm(burst, participant)
+        if success:
+            burst.failed.discard(participant)  # repaired participants can help the others again
+        return success, contacts, asyncio.get_running_loop().time()
+
+    async def run():
+        return await asyncio.gather(*(repair(participant) for participant in failed))
+
+    loop = VirtualClockLoop()
+    try:
+        return loop.run_until_complete(run()), burst
+    finally:
+        loop.close()
+
+
+def evaluate_concurrent(blocks, availability_probs, fault_models, num_bursts, repair_algorithms, num_failures,
+                        latency=exponential_latency(0.05), helper_capacity=1, contact_timeout=1.0, rack_size=1,
+                        outage_probability=0.0, outage_duration=10.0, rng=None, sink=None):
+    """
+    Simulate num_bursts bursts of num_failures simultaneous failures for every (algorithm, fault model, availability
+    probability) configuration, see simulate_burst for the network parameters
+    :param blocks: list of blocks, or a Design
+    :param sink: ResultsSink to stream the result rows to, by default they are collected in memory
+    :return: dataframe of the results with CONCURRENT_COLUMNS, or the sink if one was given
+    """
+    design = blocks if isinstance(blocks, Design) else Design(blocks)
+    rng = np.random.default_rng() if rng is None else rng
+    results_sink = ResultsSink(CONCURRENT_COLUMNS) if sink is None else sink
+
+    for repair_algo in repair_algorithms:
+        for fault_model in fault_models:
+            for prob in availability_probs:
+                successful_repairs = 0
+                total_repair_time = 0.0
+                total_contacted = 0
+                makespans = []
+                helper_loads = []
+                max_utilisation = 0.0
+                for i in range(num_bursts):
+                    repairs, burst = simulate_burst(design, CONCURRENT_ALGORITHMS[repair_algo], num_failures, prob,
+                                                    fault_model, latency, helper_capacity, contact_timeout,
+                                                    rack_size, outage_probability, outage_duration, rng)
+                    makespan = max(finish for _, _, finish in repairs)
+                    makespans.append(makespan)
+                    successful_repairs += sum(success for success, _, _ in repairs)
+                    total_repair_time += sum(finish for _, _, finish in repairs)
+                    total_contacted += sum(contacts for _, contacts, _ in repairs)
+                    helper_loads.append(burst.served)
+                    if makespan > 0:
+                        max_utilisation = max(max_utilisation, burst.busy_time.max() / (makespan * helper_capacity))
+
+                num_repairs = num_bursts * num_failures
+                loads = np.concatenate(helper_loads)
+                results = {'Algorithm': repair_algo.__name__, 'Fault model': fault_model,
+                           'Availability probability': prob, 'Failures per burst': num_failures,
+                           'Bursts': num_bursts, 'Successful repairs': successful_repairs,
+                           'Failed repairs': num_repairs - successful_repairs,
+                           'Average makespan': np.mean(makespans), 'Max makespan': max(makespans),
+                           'Throughput': successful_repairs / sum(makespans) if sum(makespans) > 0 else None,
+                           'Average repair time': total_repair_time / num_repairs,
+                           'Average contacted': total_contacted / num_repairs,
+                           'Average helper load': loads.mean(), 'Max helper load': int(loads.max()),
+                           'Max helper utilisation': max_utilisation}
+                results_sink.append(results)
+
+    return results_sink.to_dataframe() if sink is None else sink
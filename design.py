@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+from participant import Participant, ParticipantStore
+import numpy as np
+import os
+import shutil
+
+
+class Design:
+    "Compact block design: the b x v incidence matrix as CSR arrays, its inverted index and a bit-packed copy."
+
+    def __init__(self, blocks):
+        """
+        :param blocks: list of blocks (lists of share ids), block i is held by participant i
+        """
+        sizes = np.array([len(block) for block in blocks], dtype=np.int64)
+        block_ptr = np.zeros(len(blocks) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=block_ptr[1:])
+        block_shares = np.fromiter((s for block in blocks for s in block), dtype=np.int32, count=block_ptr[-1])
+        self._set_csr(block_ptr, block_shares)
+
+    @classmethod
+    def from_csr(cls, block_ptr, block_shares):
+        """
+        Build a design straight from its CSR arrays, without going through Python lists
+        :param block_ptr: offsets of each block in block_shares, length b + 1
+        :param block_shares: share ids of all blocks, concatenated
+        """
+        design = cls.__new__(cls)
+        design._set_csr(np.asarray(block_ptr), np.asarray(block_shares))
+        return design
+
+    CACHE_ARRAYS = ["block_ptr", "block_shares", "holder_ptr", "holders", "neighbour_ptr", "neighbours", "overlap"]
+
+    def save(self, directory):
+        """
+        Write the CSR arrays, the inverted index and the intersections to directory, one .npy file each. The files
+        are written to a temporary directory first and moved into place, so a directory that exists is complete.
+        :param directory: directory to create, replaced if it exists
+        """
+        neighbour_ptr, neighbours, overlap = self.intersections()
+        arrays = {"block_ptr": self.block_ptr, "block_shares": self.block_shares, "holder_ptr": self.holder_ptr,
+                  "holders": self.holders, "neighbour_ptr": neighbour_ptr, "neighbours": neighbours,
+                  "overlap": overlap}
+        temporary = directory.rstrip(os.sep) + ".tmp-%d" % os.getpid()
+        os.makedirs(temporary, exist_ok=True)
+        for name in self.CACHE_ARRAYS:
+            np.save(os.path.join(temporary, name + ".npy"), arrays[name])
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(temporary, directory)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Read a design written by save, without recomputing its inverted index or intersections
+        :param directory: directory written by save
+        :param mmap_mode: numpy memory-map mode of the arrays, None to read them into memory
+        """
+        arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)
+                  for name in cls.CACHE_ARRAYS}
+        design = cls.__new__(cls)
+        design.block_ptr = arrays["block_ptr"]
+        design.block_shares = arrays["block_shares"]
+        design.num_participants = len(design.block_ptr) - 1
+        design.holder_ptr = arrays["holder_ptr"]
+        design.holders = arrays["holders"]
+        design.num_shares = len(design.holder_ptr) - 1
+        design._incidence_bits = None
+        design._intersections = arrays["neighbour_ptr"], arrays["neighbours"], arrays["overlap"]
+        return design
+
+    def _set_csr(self, block_ptr, block_shares):
+        self.block_ptr = block_ptr
+        self.block_shares = block_shares
+        self.num_participants = len(block_ptr) - 1
+        self.num_shares = int(block_shares.max()) + 1 if len(block_shares) else 0
+
+        # Inverted index: participants holding each share, in increasing id order
+        owners = np.repeat(np.arange(self.num_participants, dtype=np.int32), np.diff(block_ptr))
+        order = np.argsort(block_shares, kind="stable")
+        self.holder_ptr = np.zeros(self.num_shares + 1, dtype=np.int64)
+        np.cumsum(np.bincount(block_shares, minlength=self.num_shares), out=self.holder_ptr[1:])
+        self.holders = owners[order]
+
+        self._incidence_bits = None
+        self._intersections = None
+
+    def block(self, i):
+        """
+        :param i: participant id
+        :return: list of the shares held by participant i
+        """
+        return self.block_shares[self.block_ptr[i]:self.block_ptr[i + 1]].tolist()
+
+    def blocks(self):
+        """
+        :return: list of all blocks
+        """
+        return [self.block(i) for i in range(self.num_participants)]
+
+    def block_sizes(self):
+        """
+        :return: array with the number of shares held by each participant
+        """
+        return np.diff(self.block_ptr)
+
+    def replication(self):
+        """
+        :return: array with the number of participants holding each share
+        """
+        return np.diff(self.holder_ptr)
+
+    def share_holders(self, s):
+        """
+        :param s: share id
+        :return: array of the participants holding share s
+        """
+        return self.holders[self.holder_ptr[s]:self.holder_ptr[s + 1]]
+
+    @property
+    def incidence_bits(self):
+        "Bit-packed b x v incidence matrix, one row of ceil(v / 8) bytes per participant."
+        if self._incidence_bits is None:
+            bits = np.zeros((self.num_participants, (self.num_shares + 7) // 8), dtype=np.uint8)
+            owners = np.repeat(np.arange(self.num_participants), self.block_sizes())
+            masks = (128 >> (self.block_shares & 7)).astype(np.uint8)
+            np.bitwise_or.at(bits, (owners, self.block_shares >> 3), masks)
+            self._incidence_bits = bits
+        return self._incidence_bits
+
+    def holds(self, participants, shares):
+        """
+        Vectorized incidence lookup
+        :param participants: array of participant ids
+        :param shares: array of share ids, broadcast against participants
+        :return: bool array, True where the participant holds the share
+        """
+        return (self.incidence_bits[participants, shares >> 3] << (shares & 7)) & 128 != 0
+
+    def intersections(self):
+        """
+        Intersecting participants of every participant, found in one pass over the inverted index: every pair of
+        holders of a share intersects, so the pairs are generated share by share and merged.
+        :return: CSR offsets, the intersecting participant ids (increasing within each participant) and the number
+        of shares each of those pairs has in common
+        """
+        if self._intersections is None:
+            replication = self.replication()
+            pair_counts = np.repeat(replication, replication)  # each holder pairs with every holder of the share
+            first = np.repeat(self.holders, pair_counts)
+            group_start = np.repeat(np.repeat(self.holder_ptr[:-1], replication), pair_counts)
+            position = np.arange(len(first)) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+            second = self.holders[group_start + position]
+
+            keep = first != second  # skip self
+            keys = first[keep].astype(np.int64) * self.num_participants + second[keep]
+            keys, overlap = np.unique(keys, return_counts=True)
+
+            ptr = np.zeros(self.num_participants + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys // self.num_participants, minlength=self.num_participants), out=ptr[1:])
+            self._intersections = ptr, (keys % self.num_participants).astype(np.int32), overlap.astype(np.int32)
+        return self._intersections
+
+    def intersecting_participants(self, i):
+        """
+        :param i: participant id
+        :return: list of the participants sharing at least one share with participant i (set R of algorithm 2)
+        """
+        ptr, neighbours, _ = self.intersections()
+        return neighbours[ptr[i]:ptr[i + 1]].tolist()
+
+    def grouped_participants(self, i):
+        """
+        :param i: participant id
+        :return: dict mapping each share of participant i to the other participants holding it (set R of algorithm 3)
+        """
+        groups = {}
+        for s in self.block(i):
+            holders = self.share_holders(s)
+            groups.update({s: holders[holders != i].tolist()})
+        return groups
+
+    def participants(self):
+        """
+        :return: dict of fully initialized Participant objects, keyed by id
+        """
+        participants = {}
+        for i in range(self.num_participants):
+            p = Participant(i, self.block(i))
+            p.intersecting_participants = self.intersecting_participants(i)
+            p.grouped_participants = self.grouped_participants(i)
+            participants.update({i: p})
+        return participants
+
+    def participant_store(self):
+        """
+        :return: ParticipantStore of the participants, the compact alternative to participants()
+        """
+        return ParticipantStore(self)
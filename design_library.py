@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+from design import Design
+import inspect
+import numpy as np
+import os
+
+DESIGN_CACHE_DIR = "design_cache"
+
+
+def _check_prime(q):
+    if q < 2 or any(q % d == 0 for d in range(2, int(q ** 0.5) + 1)):
+        raise ValueError("Only prime orders are supported, got %d" % q)
+
+
+def _from_blocks(blocks):
+    """
+    :param blocks: 2D array with one block per row, all of the same size
+    :return: Design with these blocks, built without Python lists
+    """
+    num_blocks, block_size = blocks.shape
+    return Design.from_csr(np.arange(num_blocks + 1, dtype=np.int64) * block_size,
+                           np.sort(blocks, axis=1).astype(np.int32).ravel())
+
+
+def affine_plane(q):
+    """
+    Affine plane AG(2, q): a (q^2, q^2 + q, q + 1, q, 1) design. Point (x, y) is share x * q + y, the blocks are the
+    lines y = m x + c followed by the lines x = c.
+    :param q: prime order
+    :return: Design
+    """
+    _check_prime(q)
+    x = np.arange(q, dtype=np.int64)
+    m, c = np.divmod(np.arange(q * q, dtype=np.int64), q)
+    sloped = x[None, :] * q + (m[:, None] * x[None, :] + c[:, None]) % q
+    vertical = x[:, None] * q + x[None, :]
+    return _from_blocks(np.concatenate([sloped, vertical]))
+
+
+def projective_plane(q):
+    """
+    Projective plane PG(2, q): a (q^2 + q + 1, q^2 + q + 1, q + 1, q + 1, 1) design. It extends the affine plane
+    with a point at infinity q^2 + m for each slope m (q^2 + q for the vertical lines), which every line of that
+    slope goes through, and a line at infinity through all of them.
+    :param q: prime order
+    :return: Design
+    """
+    affine = affine_plane(q)
+    lines = np.asarray(affine.block_shares).reshape(q * q + q, q)
+    infinity = q * q + np.repeat(np.arange(q + 1, dtype=np.int64), [q] * q + [q])
+    blocks = np.concatenate([np.column_stack([lines, infinity]),
+                             q * q + np.arange(q + 1, dtype=np.int64)[None, :]])
+    return _from_blocks(blocks)
+
+
+def cyclic_design(v, base_blocks):
+    """
+    Develop base blocks modulo v: every base block B gives the blocks B + t (mod v), t = 0..v-1. With a (v, k, l)
+    difference family as base blocks this is a (v, v * len(base_blocks), ., k, l) design.
+    :param v: number of shares
+    :param base_blocks: list of base blocks of the same size
+    :return: Design
+    """
+    try:
+        base = np.asarray(base_blocks, dtype=np.int64)
+    except (TypeError, ValueError):
+        base = None
+    if base is None or base.ndim != 2:
+        raise ValueError("Base blocks must be a list of blocks of the same size, got %r" % (base_blocks,))
+    shifts = np.arange(v, dtype=np.int64)
+    return _from_blocks(((base[:, None, :] + shifts[None, :, None]) % v).reshape(-1, base.shape[1]))
+
+
+def quadratic_residue_design(v):
+    """
+    Paley difference set design: the nonzero squares modulo a prime v = 3 (mod 4) form a (v, (v - 1) / 2,
+    (v - 3) / 4) difference set, developed into a symmetric design.
+    :param v: prime, 3 modulo 4
+    :return: Design
+    """
+    _check_prime(v)
+    if v % 4 != 3:
+        raise ValueError("Quadratic residue designs need v = 3 (mod 4), got %d" % v)
+    residues = np.unique(np.arange(1, v, dtype=np.int64) ** 2 % v)
+    return cyclic_design(v, [residues.tolist()])
+
+
+def _quasigroup_triples(order, combine):
+    """
+    Triples {(x, i), (y, i), (x o y, i + 1)} for every x < y and layer i of Z_3, as used by Bose and Skolem
+    :param order: order of the quasigroup, point (x, i) is share i * order + x
+    :param combine: vectorized commutative quasigroup operation
+    :return: 2D array of triples
+    """
+    x, y = (index.astype(np.int32) for index in np.triu_indices(order, k=1))
+    product = combine(x, y)
+    triples = []
+    for i in range(3):
+        j = (i + 1) % 3
+        triples.append(np.column_stack([i * order + x, i * order + y, j * order + product]))
+    return np.concatenate(triples)
+
+
+def steiner_triple_system(v):
+    """
+    Steiner triple system STS(v): a (v, v (v - 1) / 6, (v - 1) / 2, 3, 1) design, by the Bose construction for
+    v = 3 (mod 6) and the Skolem construction for v = 1 (mod 6). Point (x, i) of Z_n x Z_3 is share i * n + x, and
+    the Skolem point at infinity is share v - 1.
+    :param v: number of shares, 1 or 3 modulo 6
+    :return: Design
+    """
+    if v % 6 == 3:
+        # Bose: idempotent commutative quasigroup x o y = (x + y) / 2 modulo the odd order 2n + 1
+        order = v // 3
+        half = (order + 1) // 2
+        x = np.arange(order, dtype=np.int32)
+        blocks = np.concatenate([
+            np.column_stack([x, order + x, 2 * order + x]),
+            _quasigroup_triples(order, lambda a, b: (a + b) * half % order)])
+    elif v % 6 == 1 and v > 1:
+        # Skolem: half-idempotent commutative quasigroup of order 2n, renaming 2k to k and 2k + 1 to n + k in the
+        # addition table of Z_2n
+        n = (v - 1) // 6
+        order = 2 * n
+        x = np.arange(n, dtype=np.int32)
+        layers = np.arange(3, dtype=np.int32)
+        infinity = np.full(3 * n, v - 1, dtype=np.int32)
+        left = (layers[:, None] * order + n + x[None, :]).ravel()
+        right = (((layers[:, None] + 1) % 3) * order + x[None, :]).ravel()
+
+        def combine(a, b):
+            total = (a + b) % order
+            return total // 2 + n * (total % 2)
+
+        blocks = np.concatenate([
+            np.column_stack([x, order + x, 2 * order + x]),
+            np.column_stack([infinity, left, right]),
+            _quasigroup_triples(order, combine)])
+    else:
+        raise ValueError("Steiner triple systems need v = 1 or 3 (mod 6), got %d" % v)
+    return _from_blocks(blocks)
+
+
+GENERATORS = {
+    "affine_plane": affine_plane,
+    "projective_plane": projective_plane,
+    "cyclic": cyclic_design,
+    "quadratic_residue": quadratic_residue_design,
+    "steiner_triple": steiner_triple_system,
+}
+
+
+def design_parameters(design):
+    """
+    :param design: Design with constant block size and replication
+    :return: its "v,b,r,k,l" name, as used for the designs in experiment.py
+    """
+    sizes = np.unique(design.block_sizes())
+    replication = np.unique(design.replication())
+    if len(sizes) != 1 or len(replication) != 1:
+        raise ValueError("Design is not a BIBD: block sizes %s, replications %s" % (sizes, replication))
+    v, b, r, k = design.num_shares, design.num_participants, int(replication[0]), int(sizes[0])
+    return "%d,%d,%d,%d,%d" % (v, b, r, k, r * (k - 1) // (v - 1) if v > 1 else 0)
+
+
+def _cache_key(family, params):
+    # Nested lists use another separator, so base blocks [[0, 1], [3, 9]] and [[0, 1, 3, 9]] get different keys
+    def flatten(param, separator="_"):
+        if isinstance(param, (list, tuple, np.ndarray)):
+            return separator.join(flatten(p, ".") for p in param)
+        return str(param)
+
+    return "-".join([family] + [flatten(p) for p in params])
+
+
+def cached_design(family, *params, cache_dir=DESIGN_CACHE_DIR, mmap_mode="r"):
+    """
+    Generate a design of the library once and keep it, with its inverted index and intersections, in cache_dir.
+    Later calls memory-map the cached arrays instead of generating the design and its intersections again.
+    :param family: name of the generator in GENERATORS
+    :param params: arguments of the generator
+    :param cache_dir: directory holding one subdirectory per cached design
+    :param mmap_mode: numpy memory-map mode of the cached arrays, None to read them into memory
+    :return: Design
+    """
+    if family not in GENERATORS:
+        raise ValueError("Unknown design family %s, expected one of %s" % (family, sorted(GENERATORS)))
+    signature = inspect.signature(GENERATORS[family])
+    try:
+        signature.bind(*params)
+    except TypeError:
+        raise ValueError("Design family %s takes parameters (%s), got %d" %
+                         (family, ", ".join(signature.parameters), len(params)))
+    directory = os.path.join(cache_dir, _cache_key(family, params))
+    if not os.path.isdir(directory):
+        GENERATORS[family](*params).save(directory)
+    return Design.load(directory, mmap_mode)
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+import math
+import numpy as np
+
+
+class StreamingHistogram:
+    """
+    Fixed-memory histogram with logarithmic buckets, doubling as a streaming quantile sketch: every positive value
+    lands in the bucket (gamma^(i-1), gamma^i], so any quantile read from the buckets is within relative_accuracy of
+    the true one. Values outside the covered range are clamped into the first or last bucket; zeros are counted apart.
+    Memory is num_buckets counters, however many values are added, and histograms of the same shape can be merged.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9, num_buckets=2048):
+        """
+        :param relative_accuracy: relative error bound of the quantiles
+        :param min_value: smallest positive value kept at full accuracy
+        :param num_buckets: number of buckets, covering min_value up to min_value * gamma^num_buckets
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.offset = math.floor(math.log(min_value) / self.log_gamma)
+        self.counts = np.zeros(num_buckets, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.max = None
+
+    def add(self, value):
+        """
+        :param value: non-negative value to record
+        """
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zero_count += 1
+            return
+        i = math.ceil(math.log(value) / self.log_gamma) - self.offset
+        self.counts[min(max(i, 0), len(self.counts) - 1)] += 1
+
+    def add_many(self, values):
+        """
+        :param values: array of non-negative values to record
+        """
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return
+        positive = values[values > 0]
+        self.zero_count += values.size - positive.size
+        self.count += values.size
+        largest = float(values.max())
+        self.max = largest if self.max is None else max(self.max, largest)
+        if positive.size:
+            index = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64) - self.offset
+            np.clip(index, 0, len(self.counts) - 1, out=index)
+            self.counts += np.bincount(index, minlength=len(self.counts))
+
+    def merge(self, other):
+        """
+        Add the values recorded by another histogram of the same shape
+        :param other: StreamingHistogram
+        """
+        assert self.gamma == other.gamma and self.offset == other.offset and len(self.counts) == len(other.counts)
+        self.counts += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def _bucket_value(self, i):
+        # value within relative_accuracy of everything in bucket i
+        return 2 * self.gamma ** (i + self.offset) / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        :param q: quantile in [0, 1]
+        :return: estimate of the q-quantile of the recorded values, None if there are none
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side="right"))
+        return min(self._bucket_value(i), self.max)
+
+    def to_string(self):
+        """
+        Compact text form for a results column: "0:zeros" followed by "upper bound:count" for each non-empty bucket
+        """
+        buckets = ["0:%d" % self.zero_count] if self.zero_count else []
+        for i in np.flatnonzero(self.counts):
+            buckets.append("%.6g:%d" % (self.gamma ** (i + self.offset), self.counts[i]))
+        return " ".join(buckets)
+
+
+DISTRIBUTION_MEASURES = ['Success contacted', 'Fail contacted', 'Success wall clock time', 'Fail wall clock time']
+DISTRIBUTION_STATISTICS = [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]
+DISTRIBUTION_COLUMNS = [measure + ' ' + name for measure in DISTRIBUTION_MEASURES
+                        for name in [name for name, _ in DISTRIBUTION_STATISTICS] + ['max', 'histogram']]
+
+
+def new_histograms():
+    """
+    :return: dict of measure -> empty StreamingHistogram, one per DISTRIBUTION_MEASURES
+    """
+    return {measure: StreamingHistogram() for measure in DISTRIBUTION_MEASURES}
+
+
+def distribution_results(histograms):
+    """
+    :param histograms: dict of measure -> StreamingHistogram, as made by new_histograms
+    :return: dict mapping each of DISTRIBUTION_COLUMNS to its value, empty for measures without values
+    """
+    results = {}
+    for measure in DISTRIBUTION_MEASURES:
+        histogram = histograms[measure]
+        for name, q in DISTRIBUTION_STATISTICS:
+            results.update({measure + ' ' + name: histogram.quantile(q)})
+        results.update({measure + ' max': histogram.max})
+        results.update({measure + ' histogram': histogram.to_string() if histogram.count else None})
+    return results
@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+
+from repair import get_intersecting_shares, random_participants, stored_intersecting_participants, \
+    stored_grouped_participants
+import numpy as np
+
+
+class _SwapSet:
+    "Set of ids with O(1) add, remove and uniform sampling: the ids in a list, and the position of each id in it."
+    __slots__ = ("items", "positions")
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.positions = {x: k for k, x in enumerate(self.items)}
+
+    def add(self, x):
+        if x not in self.positions:
+            self.positions.update({x: len(self.items)})
+            self.items.append(x)
+
+    def remove(self, x):
+        # Move the last id into the hole left by x
+        k = self.positions.pop(x)
+        last = self.items.pop()
+        if last != x:
+            self.items[k] = last
+            self.positions.update({last: k})
+
+    def sample(self):
+        return self.items[np.random.randint(len(self.items))]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, x):
+        return x in self.positions
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class _TrialView:
+    """
+    Candidates of one repair, over a _SwapSet: a dropped id is swapped behind the first live ids of the set, so
+    dropping and sampling are O(1). The set keeps the same ids, only their order changes, so nothing has to be undone
+    when the repair ends and the next repair simply takes a new view.
+    """
+    __slots__ = ("ids", "live")
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.live = len(ids)
+
+    def drop(self, x):
+        items, positions = self.ids.items, self.ids.positions
+        k = positions[x]
+        if k >= self.live:
+            return  # already dropped
+        self.live -= 1
+        last = items[self.live]
+        items[k], items[self.live] = last, x
+        positions.update({last: k, x: self.live})
+
+    def sample(self):
+        return self.ids.items[np.random.randint(self.live)]
+
+    def __len__(self):
+        return self.live
+
+
+class DynamicIndex:
+    """
+    Participant index for changing membership. Participants can be marked dead, revived or added at any time, and
+    the live and dead participants, the live intersecting participants of every participant and the live holders of
+    every share are kept up to date incrementally, each as a _SwapSet so a live candidate is sampled in O(1). Marking a
+    participant dead or reviving it costs O(number of its intersecting participants + its shares), so it is kept for
+    membership changes. A repair drops the unavailable candidates of the Permanent fault model from a _TrialView of
+    the set it draws from instead, in O(1) and without touching the index.
+    """
+
+    def __init__(self, design):
+        """
+        :param design: Design, all of whose participants start live
+        """
+        self.blocks = design.blocks()
+        self.holders = [design.share_holders(s).tolist() for s in range(design.num_shares)]
+        self.neighbours = [design.intersecting_participants(i) for i in range(design.num_participants)]
+
+        self.live = _SwapSet(range(design.num_participants))
+        self.dead = _SwapSet()
+        self.live_neighbours = [_SwapSet(neighbours) for neighbours in self.neighbours]
+        self.live_holders = [_SwapSet(holders) for holders in self.holders]
+
+    @property
+    def num_participants(self):
+        return len(self.blocks)
+
+    def is_live(self, i):
+        return i in self.live
+
+    def _kill(self, i):
+        self.live.remove(i)
+        self.dead.add(i)
+        for j in self.neighbours[i]:
+            self.live_neighbours[j].remove(i)
+        for s in self.blocks[i]:
+            self.live_holders[s].remove(i)
+
+    def _revive(self, i):
+        if i in self.dead:
+            self.dead.remove(i)
+        self.live.add(i)
+        for j in self.neighbours[i]:
+            self.live_neighbours[j].add(i)
+        for s in self.blocks[i]:
+            self.live_holders[s].add(i)
+
+    def mark_dead(self, i):
+        """
+        Remove a participant from every live candidate set, doing nothing if it is already dead
+        :param i: participant id
+        """
+        if i in self.live:
+            self._kill(i)
+
+    def revive(self, i):
+        """
+        Put a dead participant back into the live candidate sets, doing nothing if it is live
+        :param i: participant id
+        """
+        if i not in self.live:
+            self._revive(i)
+
+    def add(self, block):
+        """
+        Add a new live participant holding block, which may contain new shares
+        :param block: list of share ids
+        :return: id of the new participant
+        """
+        i = len(self.blocks)
+        self.blocks.append(sorted(block))
+        while len(self.holders) <= max(block):
+            self.holders.append([])
+            self.live_holders.append(_SwapSet())
+
+        neighbours = sorted({j for s in block for j in self.holders[s]})
+        self.neighbours.append(neighbours)
+        self.live_neighbours.append(_SwapSet(j for j in neighbours if j in self.live))
+        for j in neighbours:
+            self.neighbours[j].append(i)
+        for s in block:
+            self.holders[s].append(i)
+        self._revive(i)
+        return i
+
+
+def _contact_repair(index, failed, candidates, p_available, fault):
+    # Algorithms 1 and 2: candidates is a _TrialView without the failed participant, which is live and so counted
+    # among the live holders of its shares
+    missing_shares = list(index.blocks[failed])
+    if fault == "Transient" and not all(len(index.live_holders[s]) > 1 for s in missing_shares):
+        return False, 0  # a share without other live holder would be asked for forever
+    steps = 0
+    while candidates:
+        P_id = candidates.sample()
+
+        steps += 1
+        if np.random.random_sample() > p_available:
+            if fault == "Permanent":
+                candidates.drop(P_id)
+            continue
+
+        shares = get_intersecting_shares(missing_shares, index.blocks[P_id])
+        if shares:
+            missing_shares.remove(shares[0])
+        if not missing_shares:
+            return True, steps
+    return False, steps
+
+
+def dynamic_random_participants(index, failed, p_available, fault="Transient"):
+    """
+    Algorithm 1: Random Participants, over the live participants of a DynamicIndex
+    :param index: DynamicIndex, with the same membership when the repair returns
+    :param failed: id of the live participant to repair
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    candidates = _TrialView(index.live)
+    candidates.drop(failed)
+    return _contact_repair(index, failed, candidates, p_available, fault)
+
+
+def dynamic_stored_intersecting_participants(index, failed, p_available, fault="Transient"):
+    """
+    Algorithm 2: Stored Intersecting Participants, over the live intersecting participants of a DynamicIndex
+    :param index: DynamicIndex, with the same membership when the repair returns
+    :param failed: id of the live participant to repair
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    return _contact_repair(index, failed, _TrialView(index.live_neighbours[failed]), p_available, fault)
+
+
+def dynamic_stored_grouped_participants(index, failed, p_available, fault="Transient"):
+    """
+    Algorithm 3: Stored Grouped Participants, over the live holders of each share in a DynamicIndex
+    :param index: DynamicIndex, with the same membership when the repair returns
+    :param failed: id of the live participant to repair
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Boolean (whether repair was successful) and int (# participants contacted)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+
+    steps = 0
+    for s in index.blocks[failed]:
+        repaired = False
+        s_repair_candidates = _TrialView(index.live_holders[s])
+        s_repair_candidates.drop(failed)
+        while not repaired and s_repair_candidates:
+            P_id = s_repair_candidates.sample()
+
+            steps += 1
+            if np.random.random_sample() > p_available:
+                if fault == "Permanent":
+                    s_repair_candidates.drop(P_id)
+                continue
+            repaired = True
+
+        if not repaired:
+            return False, steps
+    return True, steps
+
+
+DYNAMIC_ALGORITHMS = {
+    random_participants: dynamic_random_participants,
+    stored_intersecting_participants: dynamic_stored_intersecting_participants,
+    stored_grouped_participants: dynamic_stored_grouped_participants,
+}
+
+
+def simulate_churn(index, dynamic_algorithm, p_available, fault, num_repairs, leave_probability=0.0,
+                   join_probability=0.0):
+    """
+    Long-running simulation with churn: before each repair a random live participant leaves for good with
+    leave_probability and a random dead one rejoins with join_probability, then a random live participant fails
+    and is repaired from the current membership. The index is updated in place, never rebuilt.
+    :param index: DynamicIndex, left with the membership at the end of the run
+    :param dynamic_algorithm: one of the DYNAMIC_ALGORITHMS values
+    :param num_repairs: number of repairs to simulate
+    :return: dict with the number of repairs and failed repairs, the total contacted by successful and by failed
+    repairs, and the average number of live participants
+    """
+    failed_repairs = 0
+    total_success_contacted = 0
+    total_failed_contacted = 0
+    total_live = 0
+    for i in range(num_repairs):
+        if len(index.live) > 1 and np.random.random_sample() < leave_probability:
+            index.mark_dead(index.live.sample())
+        if index.dead and np.random.random_sample() < join_probability:
+            index.revive(index.dead.sample())
+
+        total_live += len(index.live)
+        success, participants_contacted = dynamic_algorithm(index, index.live.sample(), p_available, fault)
+        if success:
+            total_success_contacted += participants_contacted
+        else:
+            failed_repairs += 1
+            total_failed_contacted += participants_contacted
+
+    return {'Repairs': num_repairs, 'Failed repairs': failed_repairs,
+            'Success total contacted': total_success_contacted, 'Fail total contacted': total_failed_contacted,
+            'Average live participants': total_live / num_repairs if num_repairs else None}
@@ -0,0 +1,329 @@
+#!/usr/bin/python3
+
+from repair import random_participants, stored_intersecting_participants, stored_grouped_participants
+from collections import Counter
+from math import comb, prod
+import numpy as np
+import sys
+
+
+class Moments:
+    "Raw moments of the number of participants contacted, split by outcome: P(outcome), E[T; outcome], E[T^2; outcome]."
+
+    def __init__(self, success=(0.0, 0.0, 0.0), fail=(0.0, 0.0, 0.0)):
+        self.success = np.array(success, dtype=float)
+        self.fail = np.array(fail, dtype=float)
+
+    def __add__(self, other):
+        return Moments(self.success + other.success, self.fail + other.fail)
+
+    def scaled(self, weight):
+        return Moments(self.success * weight, self.fail * weight)
+
+    @staticmethod
+    def _summary(moments):
+        probability, total, squares = moments
+        if probability <= 0:
+            return probability, None, None
+        mean = total / probability
+        return probability, mean, max(squares / probability - mean * mean, 0.0)
+
+    def success_summary(self):
+        """
+        :return: success probability, mean and variance of the participants contacted in successful repairs
+        """
+        return self._summary(self.success)
+
+    def fail_summary(self):
+        """
+        :return: failure probability, mean and variance of the participants contacted in failed repairs
+        """
+        return self._summary(self.fail)
+
+
+LOWEST_SLOT = -2  # choice id of candidates giving their first missing share, see _candidate_counts
+MAX_CHAIN_STATES = 1 << 16
+
+
+class _RepairChain:
+    """
+    Absorbing Markov chain of algorithms 1 and 2. A state is the set of still missing shares of the failed participant
+    (a bitmask over its share slots) and how many candidates of each type are left to contact, where a candidate's
+    type is which of the missing shares it holds. Candidates of the same type are interchangeable, so the chain only
+    tracks their number. Under the Transient fault model the counts never change.
+    """
+
+    def __init__(self, p_available, fault, choices):
+        """
+        :param p_available: availability probability
+        :param fault: the fault model to be used {"Permanent", "Transient"}
+        :param choices: list of share choice rows; row[missing] is the slot a candidate holding several missing
+        shares gives, as in BatchTables.choices
+        """
+        self.p_available = p_available
+        self.permanent = fault == "Permanent"
+        self.choices = choices
+        self.memo = {}
+
+    def _canonical(self, missing, counts):
+        """
+        Merge candidate types that behave the same from this state on. When every candidate holds at most one missing
+        share, the shares are also interchangeable and are relabelled by decreasing number of holders.
+        :param missing: bitmask of missing share slots
+        :param counts: iterable of ((pattern, choice id), count)
+        :return: hashable state (missing, sorted tuple of ((pattern, choice id), count))
+        """
+        merged = {}
+        for (pattern, choice_id), count in counts:
+            pattern &= missing
+            key = (pattern, choice_id if bin(pattern).count("1") > 1 else -1)
+            merged.update({key: merged.get(key, 0) + count})
+
+        if all(choice_id == -1 for _, choice_id in merged):
+            holders = sorted((merged.get((1 << slot, -1), 0) for slot in range(missing.bit_length())
+                              if missing >> slot & 1), reverse=True)
+            relabelled = {(1 << slot, -1): count for slot, count in enumerate(holders)}
+            relabelled.update({(0, -1): merged.get((0, -1), 0)})
+            missing, merged = (1 << len(holders)) - 1, relabelled
+
+        return missing, tuple(sorted(item for item in merged.items() if item[1] > 0))
+
+    def moments(self, missing, counts):
+        """
+        :param missing: bitmask of missing share slots
+        :param counts: ((pattern, choice id), count) of the candidates still to be contacted
+        :return: Moments of the number of participants contacted from this state until the repair ends
+        """
+        state = self._canonical(missing, counts)
+        if state not in self.memo:
+            if len(self.memo) >= MAX_CHAIN_STATES:
+                raise ValueError("Markov chain has more than %d states, simulate this design instead"
+                                 % MAX_CHAIN_STATES)
+            self.memo.update({state: self._solve(*state)})
+        return self.memo[state]
+
+    @staticmethod
+    def _one_more_step(moments):
+        # moments of T + 1 from those of T: E[(T + 1)^2] = E[T^2] + 2 E[T] + P
+        probability, total, squares = moments
+        return probability, total + probability, squares + 2 * total + probability
+
+    def _solve(self, missing, counts):
+        if not missing:
+            return Moments(success=(1.0, 0.0, 0.0))
+        total = sum(count for _, count in counts)
+        if total == 0:
+            return Moments(fail=(1.0, 0.0, 0.0))
+
+        p = self.p_available
+        stay = 0.0  # probability that a step leaves the state unchanged
+        outcomes = []  # (probability, next state moments)
+        for i, ((pattern, choice_id), count) in enumerate(counts):
+            weight = count / total
+            # Available: the candidate gives one of the missing shares it holds, if any
+            if not pattern:
+                stay += weight * p
+            elif p > 0:
+                if choice_id == -1:
+                    slot = pattern
+                elif choice_id == LOWEST_SLOT:
+                    slot = pattern & -pattern
+                else:
+                    slot = 1 << self.choices[choice_id][missing]
+                outcomes.append((weight * p, self.moments(missing & ~slot, counts)))
+            # Unavailable: the candidate is dropped under the Permanent fault model
+            if not self.permanent:
+                stay += weight * (1 - p)
+            elif p < 1:
+                fewer = counts[:i] + (((pattern, choice_id), count - 1),) + counts[i + 1:]
+                outcomes.append((weight * (1 - p), self.moments(missing, fewer)))
+
+        if stay >= 1:
+            raise ValueError("Repair never terminates: no reachable participant holds a missing share")
+        # T = 1 + T', where T' is the number of contacts from the next state; solve out the self-loops
+        result = Moments()
+        for probability, moments in outcomes:
+            result = result + Moments(self._one_more_step(moments.success),
+                                      self._one_more_step(moments.fail)).scaled(probability)
+        for part in (result.success, result.fail):
+            part[0] = part[0] / (1 - stay)
+            part[1] = (part[1] + stay * part[0]) / (1 - stay)
+            part[2] = (part[2] + stay * (part[0] + 2 * part[1])) / (1 - stay)
+        return result
+
+
+def _reachable_states(missing, counts, drops):
+    """
+    Upper bound on the number of states of the chain reachable from a state, counted without exploring them
+    :param missing: bitmask of missing share slots, of a state returned by _RepairChain._canonical
+    :param counts: sorted tuple of ((pattern, choice id), count) of the same state
+    :param drops: whether unavailable candidates are dropped, i.e. Permanent fault model and p_available < 1
+    :return: int
+    """
+    num_slots = bin(missing).count("1")
+    if all(choice_id == -1 for (_, choice_id), _ in counts):
+        # Relabelled states only depend on the multiset of holder counts of the missing shares, and on the number of
+        # candidates holding none of them, which grows by the holders of every repaired share
+        holders = [count for (pattern, _), count in counts if pattern]
+        holders += [0] * (num_slots - len(holders))
+        if not drops:
+            return prod(multiplicity + 1 for multiplicity in Counter(holders).values())
+        non_holders = sum(count for (pattern, _), count in counts if not pattern)
+        most = max(holders, default=0)
+        return sum(comb(j + most, j) * (non_holders + most * (num_slots - j) + 1) for j in range(num_slots + 1))
+    if not drops:
+        return 1 << num_slots
+    # Any subset of the missing shares, with any number left of each candidate type once the types are merged for it
+    states = 0
+    subset = missing
+    while True:
+        merged = {}
+        for (pattern, choice_id), count in counts:
+            pattern &= subset
+            key = (pattern, choice_id if bin(pattern).count("1") > 1 else -1)
+            merged.update({key: merged.get(key, 0) + count})
+        states += prod(count + 1 for count in merged.values())
+        if not subset or states > MAX_CHAIN_STATES:
+            return states
+        subset = (subset - 1) & missing
+
+
+def _candidate_counts(tables, failed, candidates, choice_ids):
+    """
+    :param tables: BatchTables of the design
+    :param failed: failed participant id
+    :param candidates: array of candidate participant ids
+    :param choice_ids: dict of choice row bytes -> id, extended with the rows of new candidates
+    :return: list of ((pattern, choice id), count) of the candidates
+    """
+    slots = tables.shares[failed][tables.share_mask[failed]]
+    held = tables.design.holds(candidates[:, None], slots[None, :])
+    patterns = held @ (1 << np.arange(len(slots)))
+
+    counts = {}
+    for candidate, pattern in zip(candidates, patterns.tolist()):
+        choice_id = -1
+        if bin(pattern).count("1") > 1:
+            key = np.int64(failed) * tables.num_participants + candidate
+            position = np.searchsorted(tables.choice_keys, key)
+            if position < len(tables.choice_keys) and tables.choice_keys[position] == key:
+                choice_id = choice_ids.setdefault(tables.choices[position].tobytes(), len(choice_ids))
+            else:
+                choice_id = LOWEST_SLOT  # design too large to tabulate, BatchTables takes the first missing share
+        counts.update({(pattern, choice_id): counts.get((pattern, choice_id), 0) + 1})
+    return list(counts.items())
+
+
+def _exact_contact_repair(tables, p_available, fault, all_participants):
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * (tables.num_participants + tables.max_block_size) + 1000))
+
+    choice_ids = {}
+    per_failed = []
+    for failed in range(tables.num_participants):
+        if all_participants:
+            candidates = np.delete(np.arange(tables.num_participants), failed)
+        else:
+            candidates = tables.neighbours[failed, :tables.neighbour_count[failed]]
+        missing = (1 << int(tables.share_mask[failed].sum())) - 1
+        per_failed.append((missing, _candidate_counts(tables, failed, candidates, choice_ids)))
+
+    chain = _RepairChain(p_available, fault, [np.frombuffer(row, dtype=np.int8).tolist() for row in choice_ids])
+    # Give up at once, rather than after exploring MAX_CHAIN_STATES states, when the chain of one failed participant
+    # may already be larger than that
+    states = max(_reachable_states(*state, chain.permanent and p_available < 1)
+                 for state in {chain._canonical(missing, counts) for missing, counts in per_failed})
+    if states > MAX_CHAIN_STATES:
+        raise ValueError("Markov chain may have more than %d states, simulate this design instead" % MAX_CHAIN_STATES)
+    result = Moments()
+    for missing, counts in per_failed:
+        result = result + chain.moments(missing, counts).scaled(1 / tables.num_participants)
+    return result
+
+
+def exact_random_participants(tables, p_available, fault="Transient"):
+    """
+    Algorithm 1: Random Participants, solved exactly as an absorbing Markov chain
+    :param tables: BatchTables of the design
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Moments of the number of participants contacted, averaged over a uniformly chosen failed participant
+    """
+    return _exact_contact_repair(tables, p_available, fault, True)
+
+
+def exact_stored_intersecting_participants(tables, p_available, fault="Transient"):
+    """
+    Algorithm 2: Stored Intersecting Participants, solved exactly as an absorbing Markov chain
+    :param tables: BatchTables of the design
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Moments of the number of participants contacted, averaged over a uniformly chosen failed participant
+    """
+    return _exact_contact_repair(tables, p_available, fault, False)
+
+
+def exact_stored_grouped_participants(tables, p_available, fault="Transient"):
+    """
+    Algorithm 3: Stored Grouped Participants, in closed form. Each share takes a geometric number of contacts over
+    its group of candidates, truncated at the group size under the Permanent fault model, and the repair stops at the
+    first share that cannot be repaired.
+    :param tables: BatchTables of the design
+    :param p_available: availability probability
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Moments of the number of participants contacted, averaged over a uniformly chosen failed participant
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    p, q = p_available, 1 - p_available
+
+    result = Moments()
+    for failed in range(tables.num_participants):
+        sizes = tables.group_sizes[failed][tables.share_mask[failed]]
+
+        if fault == "Transient":
+            # Every share with candidates takes a geometric number of contacts; the scalar loop gives up at once on
+            # the first share with an empty group
+            empty = np.flatnonzero(sizes == 0)
+            contacted_shares = empty[0] if empty.size else len(sizes)
+            if contacted_shares and p <= 0:
+                raise ValueError("Transient repair never terminates when p_available is 0")
+            mean = contacted_shares / p if contacted_shares else 0.0
+            variance = contacted_shares * q / p ** 2 if contacted_shares else 0.0
+            if empty.size:
+                moments = Moments(fail=(1.0, mean, variance + mean ** 2))
+            else:
+                moments = Moments(success=(1.0, mean, variance + mean ** 2))
+            result = result + moments.scaled(1 / tables.num_participants)
+            continue
+
+        reached = 1.0  # probability that every earlier share was repaired
+        mean = 0.0  # mean and variance of the contacts spent on the earlier shares, given they were repaired
+        variance = 0.0
+        moments = Moments()
+        for m in sizes.tolist():
+            # The share fails after all m candidates turned out unavailable
+            fail_steps = mean + m
+            moments = moments + Moments(fail=(1.0, fail_steps, variance + fail_steps ** 2)).scaled(reached * q ** m)
+
+            t = np.arange(1, m + 1)
+            weights = p * q ** (t - 1)
+            share_success = weights.sum()
+            if share_success <= 0:
+                reached = 0.0
+                break
+            share_mean = (weights * t).sum() / share_success
+            reached *= share_success
+            mean += share_mean
+            variance += (weights * t * t).sum() / share_success - share_mean ** 2
+        moments = moments + Moments(success=(1.0, mean, variance + mean ** 2)).scaled(reached)
+        result = result + moments.scaled(1 / tables.num_participants)
+    return result
+
+
+EXACT_ALGORITHMS = {
+    random_participants: exact_random_participants,
+    stored_intersecting_participants: exact_stored_intersecting_participants,
+    stored_grouped_participants: exact_stored_grouped_participants,
+}
@@ -1,23 +1,60 @@
 #!/usr/bin/python3
 
 from repair import *
+from batch_repair import *
+from design import Design
+from exact import EXACT_ALGORITHMS
+from results import ResultsSink
+from distributions import DISTRIBUTION_COLUMNS, new_histograms, distribution_results
+from stopping import RunningStats, converged, z_value
+from checkpoint import CheckpointLog, global_rng_state, set_global_rng_state
+import instrumentation
+
+import hashlib
+import os
 
 import random as r
-import pandas as pd
 import time
 
 
+RESULT_COLUMNS = ['Algorithm', 'Fault model', 'Availability probability',
+                  'Successful repairs', 'Success total contacted', 'Success average contacted',
+                  'Total success wall clock time', 'Average success wall clock time',
+                  'Total success process time', 'Average success process time',
+                  'Failed repairs', 'Fail total contacted', 'Fail average contacted',
+                  'Total fail wall clock time', 'Average fail wall clock time',
+                  'Total fail process time', 'Average fail process time']
+
+ADAPTIVE_COLUMNS = ['Iterations']
+EXACT_COLUMNS = ['Success probability', 'Success contacted variance', 'Fail contacted variance']
+
+
+def result_columns(distributions=False, adaptive=False):
+    """
+    :param distributions: whether distributions are recorded
+    :param adaptive: whether configurations stop adaptively
+    :return: the columns of evaluate_design results with these options
+    """
+    columns = RESULT_COLUMNS.copy()
+    if distributions:
+        columns += DISTRIBUTION_COLUMNS
+    if adaptive:
+        columns += ADAPTIVE_COLUMNS
+    return columns
+
+
 def init_intersecting_participants(participants_dic):
     """
     Initialization function to set up the intersecting participants list for each of the participant objects
     :param participants_dic: the full set of participants
     """
-    for id_num, participant in participants_dic.items():
-        for other_participant in participants_dic.values():
-            if id_num == other_participant.id_num:  # skip self
-                continue
-            if not set(participant.shares).isdisjoint(other_participant.shares):
-                participant.intersecting_participants.append(other_participant.id_num)
+    with instrumentation.timed('init intersecting participants'):
+        ids = list(participants_dic)
+        design = Design([participant.shares for participant in participants_dic.values()])
+        for n, participant in enumerate(participants_dic.values()):
+            participant.intersecting_participants.extend(ids[m] for m in design.intersecting_participants(n))
+    if instrumentation.ENABLED:
+        instrumentation.count('init passes')
 
 
 def init_grouped_participants(participants_dic):
@@ -25,42 +62,120 @@ def init_grouped_participants(participants_dic):
     Initialization function to set up the grouped participants dictionary for each of the participant objects
     :param participants_dic:
     """
-    for id_num, participant in participants_dic.items():
-        for s in participant.shares:
-            participant.grouped_participants.update({s: []})
-        for other_participant in participants_dic.values():
-            if id_num == other_participant.id_num:  # skip self
-                continue
-            for s in participant.shares:
-                if s in other_participant.shares:
-                    l = participant.grouped_participants.get(s)
-                    l.append(other_participant.id_num)
-                    participant.grouped_participants[s] = l.copy()
-
-
-def evaluate_design(blocks, availability_probs, fault_models, num_iterations, repair_algorithms):
-    # Instantiate participants and add to dict
-    participants = {}
-    for i, block in enumerate(blocks):
-        p = Participant(i, block)
-        participants.update({i: p})
-    # Initialize extra participant attributes
-    init_intersecting_participants(participants)
-    init_grouped_participants(participants)
-
-    # Initialize dataframe to save results to
-    df = pd.DataFrame(columns=['Algorithm', 'Fault model', 'Availability probability',
-                               'Successful repairs', 'Success total contacted', 'Success average contacted',
-                               'Total success wall clock time', 'Average success wall clock time',
-                               'Total success process time', 'Average success process time',
-                               'Failed repairs', 'Fail total contacted', 'Fail average contacted',
-                               'Total fail wall clock time', 'Average fail wall clock time',
-                               'Total fail process time', 'Average fail process time'])
+    with instrumentation.timed('init grouped participants'):
+        ids = list(participants_dic)
+        design = Design([participant.shares for participant in participants_dic.values()])
+        for n, participant in enumerate(participants_dic.values()):
+            for s, group in design.grouped_participants(n).items():
+                participant.grouped_participants.update({s: [ids[m] for m in group]})
+    if instrumentation.ENABLED:
+        instrumentation.count('init passes')
+
+
+def checkpoint_config(engine, design, availability_probs, fault_models, num_iterations, repair_algorithms,
+                      **options):
+    """
+    :param engine: name of the evaluate function
+    :param design: Design being evaluated, identified in the checkpoint by a hash of its blocks
+    :param options: other settings changing the results
+    :return: dict of the settings a checkpoint must have been written with to be resumed
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(design.block_ptr, dtype=np.int64).tobytes() +
+                            np.ascontiguousarray(design.block_shares, dtype=np.int32).tobytes()).hexdigest()
+    config = {'engine': engine, 'design': digest, 'availability_probs': list(availability_probs),
+              'fault_models': list(fault_models), 'num_iterations': num_iterations,
+              'algorithms': [repair_algo.__name__ for repair_algo in repair_algorithms]}
+    config.update(options)
+    return config
+
+
+def resume_checkpoint(checkpoint, results_sink, config):
+    """
+    Replay the rows of the cells a checkpoint has already finished into the sink
+    :param checkpoint: CheckpointLog, or None when not checkpointing
+    :param config: settings of this run, from checkpoint_config
+    :return: the RNG state after the last finished cell, None if there is none
+    """
+    if checkpoint is None:
+        return None
+    for row in checkpoint.start(config):
+        results_sink.append(row)
+    return checkpoint.last_state()
+
+
+def helper_availabilities(prob, num_participants, concentration, seed=0):
+    """
+    :param prob: mean availability probability
+    :param num_participants: number of participants
+    :param concentration: alpha + beta of the Beta distribution, the lower the more the participants differ
+    :param seed: seed of the draw, so every algorithm faces the same participants
+    :return: array of the availability probability of every participant, Beta distributed with mean prob
+    """
+    if prob <= 0 or prob >= 1:
+        return np.full(num_participants, float(prob))
+    return np.random.default_rng(seed).beta(prob * concentration, (1 - prob) * concentration, num_participants)
+
+
+def evaluate_design(blocks, availability_probs, fault_models, num_iterations, repair_algorithms, sink=None,
+                    distributions=False, tolerance=None, batch_size=100, confidence=0.95, checkpoint=None,
+                    availability_concentration=None, availability_seed=0):
+    """
+    Simulate num_iterations repairs for every (algorithm, fault model, availability probability) configuration
+    :param blocks: list of blocks, or a Design such as one loaded by design_library.cached_design
+    :param sink: ResultsSink to stream the result rows to, by default they are collected in memory
+    :param distributions: also record the distribution of participants contacted and of the wall clock time per
+    repair in fixed-memory histograms, adding DISTRIBUTION_COLUMNS to the results
+    :param tolerance: if given, stop a configuration early once the Wilson interval of the success rate and the
+    confidence interval of the success average contacted are within tolerance of their centres, with at least
+    stopping.MIN_SUCCESSES successful repairs, checked every batch_size repairs after the first two batches.
+    num_iterations is then the budget cap, and the repairs used are added as ADAPTIVE_COLUMNS.
+    :param batch_size: number of repairs between two convergence checks
+    :param confidence: confidence level of the intervals
+    :param checkpoint: CheckpointLog recording every finished configuration with the state of the random and
+    numpy.random generators. The configurations it already holds are skipped, their rows copied to the sink, and the
+    run goes on from the saved generator state as if it had never stopped.
+    :param availability_concentration: if given, every participant keeps its own availability probability for the
+    whole configuration, drawn by helper_availabilities with the configuration's probability as mean, so some helpers
+    are reliably more available than others. By default every contact is available with the same probability.
+    :param availability_seed: seed of helper_availabilities, the same for every algorithm and fault model
+    When instrumentation is enabled, the counters and timers of the initialization and of each configuration are
+    recorded as instrumentation breakdown rows.
+    :return: dataframe of the results, or the sink if one was given
+    """
+    # Store the participants, with their intersecting and grouped participants, as arrays
+    instrumentation.reset()
+    with instrumentation.timed('init'):
+        design = blocks if isinstance(blocks, Design) else Design(blocks)
+        participants = design.participant_store()
+    instrumentation.record('init')
+
+    # Initialize sink to save results to
+    columns = result_columns(distributions, tolerance is not None)
+    results_sink = ResultsSink(columns) if sink is None else sink
+    z = z_value(confidence)
+
+    state = resume_checkpoint(checkpoint, results_sink,
+                              checkpoint_config('evaluate_design', design, availability_probs, fault_models,
+                                                num_iterations, repair_algorithms, distributions=distributions,
+                                                tolerance=tolerance, batch_size=batch_size, confidence=confidence,
+                                                availability_concentration=availability_concentration,
+                                                availability_seed=availability_seed))
+    if state is not None:
+        set_global_rng_state(state)
 
     # Loop through so many things
     for repair_algo in repair_algorithms:
         for fault_model in fault_models:
             for prob in availability_probs:
+                cell = (repair_algo.__name__, fault_model, prob)
+                if checkpoint is not None and checkpoint.finished(cell):
+                    continue
+                availability_estimator.reset()  # adaptive_participants learns each configuration afresh
+                p_available = prob
+                if availability_concentration is not None:
+                    p_available = helper_availabilities(prob, participants.num_participants,
+                                                        availability_concentration, availability_seed)
+
                 repair_wall_time = 0.0
                 repair_process_time = 0.0
                 total_success_contacted = 0
@@ -70,20 +185,32 @@ def evaluate_design(blocks, availability_probs, fault_models, num_iterations, re
                 fail_process_time = 0.0
                 total_failed_contacted = 0
 
+                histograms = new_histograms() if distributions else None
+                success_stats = RunningStats()
+                contacted_stats = RunningStats()
+
+                instrumented = instrumentation.ENABLED
+                iterations = 0
                 for i in range(num_iterations):
 
-                    participant_to_repair = participants.get((r.sample(participants.keys(), 1)[0]))
-                    participants_copy = participants.copy()  # send copy of dict to algo 1 so can pop from dict for
-                    # permanent fault
-                    participants_copy.pop(
-                        participant_to_repair.id_num)  # remove ptcpnt to repair from dict so don't contact self
+                    # Every participant but the one to repair can be contacted, and the algorithms drop participants
+                    # from the store's per-trial set instead of popping them from a copied dict
+                    if instrumented:
+                        section_start = time.perf_counter()
+                    participant_to_repair = participants.new_trial(r.randrange(participants.num_participants))
+                    if instrumented:
+                        instrumentation.add_time('new trial', time.perf_counter() - section_start)
 
-                    start_wall_time = time.clock()
+                    start_wall_time = time.perf_counter()
                     start_process_time = time.process_time()
-                    success, participants_contacted = repair_algo(participants_copy, participant_to_repair,
-                                                                  prob, fault_model)
-                    end_wall_time = (time.clock() - start_wall_time)
+                    success, participants_contacted = repair_algo(participants, participant_to_repair,
+                                                                  p_available, fault_model)
+                    end_wall_time = (time.perf_counter() - start_wall_time)
                     end_process_time = (time.process_time() - start_process_time)
+                    if instrumented:
+                        instrumentation.add_time('repair', end_wall_time)
+                        instrumentation.count('repairs')
+                        instrumentation.count('contact attempts', participants_contacted)
 
                     if success:
                         repair_wall_time += end_wall_time
@@ -95,103 +222,244 @@ def evaluate_design(blocks, availability_probs, fault_models, num_iterations, re
                         fail_process_time += end_process_time
                         total_failed_contacted += participants_contacted
 
-                success_repairs = num_iterations - failed_repairs
-
-                results = {}
-                results.update({'Algorithm': str(repair_algo.__name__)})
-                results.update({'Fault model': fault_model})
-                results.update({'Availability probability': prob})
-                results.update({'Fault model': fault_model})
-                if success_repairs > 0:
-                    results.update({'Successful repairs': success_repairs})
-                    results.update({'Success total contacted': total_success_contacted})
-                    results.update({'Success average contacted': (total_success_contacted / success_repairs)})
-                    results.update({'Total success wall clock time': repair_wall_time})
-                    results.update({'Average success wall clock time': (repair_wall_time / success_repairs)})
-                    results.update({'Total success process time': repair_process_time})
-                    results.update({'Average success process time': (repair_process_time / success_repairs)})
-                else:
-                    results.update({'Successful repairs': 0})
-                    results.update({'Success total contacted': None})
-                    results.update({'Success average contacted': None})
-                    results.update({'Total success wall clock time': None})
-                    results.update({'Average success wall clock time': None})
-                    results.update({'Total success process time': None})
-                    results.update({'Average success process time': None})
-
-                if failed_repairs > 0:
-                    results.update({'Failed repairs': failed_repairs})
-                    results.update({'Fail total contacted': total_failed_contacted})
-                    results.update({'Fail average contacted': (total_failed_contacted / failed_repairs)})
-                    results.update({'Total fail wall clock time': fail_wall_time})
-                    results.update({'Average fail wall clock time': (fail_wall_time / failed_repairs)})
-                    results.update({'Total fail process time': fail_process_time})
-                    results.update({'Average fail process time': (fail_process_time / failed_repairs)})
-                else:
-                    results.update({'Failed repairs': 0})
-                    results.update({'Fail total contacted': None})
-                    results.update({'Fail average contacted': None})
-                    results.update({'Total fail wall clock time': None})
-                    results.update({'Average fail wall clock time': None})
-                    results.update({'Total fail process time': None})
-                    results.update({'Average fail process time': None})
-
-                df = df.append(results, ignore_index=True)
-    return df
+                    if histograms:
+                        outcome = 'Success' if success else 'Fail'
+                        histograms[outcome + ' contacted'].add(participants_contacted)
+                        histograms[outcome + ' wall clock time'].add(end_wall_time)
+
+                    iterations += 1
+                    if tolerance is not None:
+                        success_stats.add(success)
+                        if success:
+                            contacted_stats.add(participants_contacted)
+                        if iterations % batch_size == 0 and iterations >= 2 * batch_size and \
+                                converged(success_stats, contacted_stats, tolerance, z):
+                            break
+
+                results = repair_results(repair_algo.__name__, fault_model, prob, iterations, failed_repairs,
+                                         total_success_contacted, repair_wall_time, repair_process_time,
+                                         total_failed_contacted, fail_wall_time, fail_process_time)
+                if histograms:
+                    results.update(distribution_results(histograms))
+                if tolerance is not None:
+                    results.update({'Iterations': iterations})
+                with instrumentation.timed('sink append'):
+                    results_sink.append(results)
+                if checkpoint is not None:
+                    with instrumentation.timed('checkpoint'):
+                        checkpoint.record(cell, results, global_rng_state())
+                instrumentation.record(*cell)
+    return results_sink.to_dataframe() if sink is None else sink
+
+
+def repair_results(algorithm_name, fault_model, prob, num_iterations, failed_repairs,
+                   total_success_contacted, repair_wall_time, repair_process_time,
+                   total_failed_contacted, fail_wall_time, fail_process_time):
+    """
+    Build the results row for one (algorithm, fault model, availability probability) configuration
+    :return: dict mapping each of RESULT_COLUMNS to its value
+    """
+    success_repairs = num_iterations - failed_repairs
+
+    results = {}
+    results.update({'Algorithm': algorithm_name})
+    results.update({'Fault model': fault_model})
+    results.update({'Availability probability': prob})
+    if success_repairs > 0:
+        results.update({'Successful repairs': success_repairs})
+        results.update({'Success total contacted': total_success_contacted})
+        results.update({'Success average contacted': (total_success_contacted / success_repairs)})
+        results.update({'Total success wall clock time': repair_wall_time})
+        results.update({'Average success wall clock time': (repair_wall_time / success_repairs)})
+        results.update({'Total success process time': repair_process_time})
+        results.update({'Average success process time': (repair_process_time / success_repairs)})
+    else:
+        results.update({'Successful repairs': 0})
+        results.update({'Success total contacted': None})
+        results.update({'Success average contacted': None})
+        results.update({'Total success wall clock time': None})
+        results.update({'Average success wall clock time': None})
+        results.update({'Total success process time': None})
+        results.update({'Average success process time': None})
+
+    if failed_repairs > 0:
+        results.update({'Failed repairs': failed_repairs})
+        results.update({'Fail total contacted': total_failed_contacted})
+        results.update({'Fail average contacted': (total_failed_contacted / failed_repairs)})
+        results.update({'Total fail wall clock time': fail_wall_time})
+        results.update({'Average fail wall clock time': (fail_wall_time / failed_repairs)})
+        results.update({'Total fail process time': fail_process_time})
+        results.update({'Average fail process time': (fail_process_time / failed_repairs)})
+    else:
+        results.update({'Failed repairs': 0})
+        results.update({'Fail total contacted': None})
+        results.update({'Fail average contacted': None})
+        results.update({'Total fail wall clock time': None})
+        results.update({'Average fail wall clock time': None})
+        results.update({'Total fail process time': None})
+        results.update({'Average fail process time': None})
+    return results
+
+
+def evaluate_design_batch(blocks, availability_probs, fault_models, num_iterations, repair_algorithms, rng=None,
+                          sink=None, distributions=False, tolerance=None, batch_size=10000, confidence=0.95,
+                          checkpoint=None):
+    """
+    Same evaluation as evaluate_design, but each configuration is simulated by the batched algorithms in
+    batch_repair.py, which makes far larger num_iterations practical. Repairs are not timed one by one here,
+    so the time of each configuration is split between its successful and failed repairs by their count.
+    :param blocks: list of blocks, or a Design
+    :param rng: numpy Generator, a fresh one is used if None
+    :param sink: ResultsSink to stream the result rows to, by default they are collected in memory
+    :param distributions: also record the distribution of participants contacted in fixed-memory histograms,
+    adding DISTRIBUTION_COLUMNS to the results (the wall clock time ones stay empty)
+    :param tolerance: if given, stop a configuration early as in evaluate_design, checking every batch_size repairs
+    :param batch_size: number of repairs between two convergence checks
+    :param confidence: confidence level of the intervals
+    :param checkpoint: CheckpointLog to resume from and record to as in evaluate_design, saving the state of rng
+    :return: dataframe of the results, or the sink if one was given
+    """
+    design = blocks if isinstance(blocks, Design) else Design(blocks)
+    tables = BatchTables(design)
+    rng = np.random.default_rng() if rng is None else rng
+    columns = result_columns(distributions, tolerance is not None)
+    results_sink = ResultsSink(columns) if sink is None else sink
+    z = z_value(confidence)
+    chunk_size = 65536 if tolerance is None else batch_size
+
+    state = resume_checkpoint(checkpoint, results_sink,
+                              checkpoint_config('evaluate_design_batch', design, availability_probs, fault_models,
+                                                num_iterations, repair_algorithms, distributions=distributions,
+                                                tolerance=tolerance, batch_size=batch_size, confidence=confidence))
+    if state is not None:
+        rng.bit_generator.state = state
+
+    for repair_algo in repair_algorithms:
+        for fault_model in fault_models:
+            for prob in availability_probs:
+                cell = (repair_algo.__name__, fault_model, prob)
+                if checkpoint is not None and checkpoint.finished(cell):
+                    continue
+
+                start_wall_time = time.perf_counter()
+                start_process_time = time.process_time()
+                failed_repairs = 0
+                total_success_contacted = 0
+                total_failed_contacted = 0
+                histograms = new_histograms() if distributions else None
+                success_stats = RunningStats()
+                contacted_stats = RunningStats()
+
+                iterations = 0
+                for success, steps in simulate_repairs(tables, BATCH_ALGORITHMS[repair_algo], prob, fault_model,
+                                                       num_iterations, rng, chunk_size):
+                    failed_repairs += int(np.count_nonzero(~success))
+                    total_success_contacted += int(steps[success].sum())
+                    total_failed_contacted += int(steps[~success].sum())
+                    if histograms:
+                        histograms['Success contacted'].add_many(steps[success])
+                        histograms['Fail contacted'].add_many(steps[~success])
+
+                    iterations += len(success)
+                    if tolerance is not None:
+                        success_stats.add_many(success)
+                        contacted_stats.add_many(steps[success])
+                        if iterations >= 2 * batch_size and converged(success_stats, contacted_stats, tolerance, z):
+                            break
+                wall_time = time.perf_counter() - start_wall_time
+                process_time = time.process_time() - start_process_time
+
+                success_share = (iterations - failed_repairs) / iterations
+                results = repair_results(repair_algo.__name__, fault_model, prob, iterations, failed_repairs,
+                                         total_success_contacted, wall_time * success_share,
+                                         process_time * success_share, total_failed_contacted,
+                                         wall_time * (1 - success_share), process_time * (1 - success_share))
+                if histograms:
+                    results.update(distribution_results(histograms))
+                if tolerance is not None:
+                    results.update({'Iterations': iterations})
+                results_sink.append(results)
+                if checkpoint is not None:
+                    checkpoint.record(cell, results, rng.bit_generator.state)
+    return results_sink.to_dataframe() if sink is None else sink
+
+
+def evaluate_design_exact(blocks, availability_probs, fault_models, num_iterations, repair_algorithms, sink=None):
+    """
+    Exact counterpart of evaluate_design: every configuration is solved analytically by exact.py instead of being
+    simulated. The counts and totals are the expected values for num_iterations repairs, the time columns are left
+    empty, and the success probability and the variances of the number of participants contacted are added.
+    Configurations whose Markov chain is too large to solve are left empty as well. Under the Permanent fault model
+    the chains of algorithms 1 and 2 track the candidates left of every type, so they only fit in MAX_CHAIN_STATES on
+    small or linear designs: those cells of the (36,42,7,6,1) design, whose blocks meet in up to 5 shares, are left
+    empty. They are detected before solving, so they cost no time.
+    :param blocks: list of blocks, or a Design
+    :param sink: ResultsSink with RESULT_COLUMNS + EXACT_COLUMNS to stream the result rows to, by default they are
+    collected in memory
+    :return: dataframe of the results, or the sink if one was given
+    """
+    tables = BatchTables(blocks if isinstance(blocks, Design) else Design(blocks))
+    results_sink = ResultsSink(RESULT_COLUMNS + EXACT_COLUMNS) if sink is None else sink
+
+    for repair_algo in repair_algorithms:
+        for fault_model in fault_models:
+            for prob in availability_probs:
+                try:
+                    moments = EXACT_ALGORITHMS[repair_algo](tables, prob, fault_model)
+                except ValueError:
+                    results_sink.append({'Algorithm': repair_algo.__name__, 'Fault model': fault_model,
+                                         'Availability probability': prob})
+                    continue
+                success_probability, success_mean, success_variance = moments.success_summary()
+                fail_probability, fail_mean, fail_variance = moments.fail_summary()
+
+                results = repair_results(repair_algo.__name__, fault_model, prob, num_iterations,
+                                         num_iterations * fail_probability,
+                                         num_iterations * moments.success[1], 0.0, 0.0,
+                                         num_iterations * moments.fail[1], 0.0, 0.0)
+                for column in RESULT_COLUMNS:
+                    if 'time' in column:
+                        results.update({column: None})
+                results.update({'Success probability': success_probability})
+                results.update({'Success contacted variance': success_variance})
+                results.update({'Fail contacted variance': fail_variance})
+                results_sink.append(results)
+    return results_sink.to_dataframe() if sink is None else sink
 
 
 """
-Test algorithm
+Designs to evaluate, keyed by their (v, b, r, k, lambda) parameters
 """
-avail_probs = [1, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1]
-fault_models_list = ["Permanent", "Transient"]
-num_repair_iterations = 1000
-repair_algos_list = [random_participants, stored_intersecting_participants, stored_grouped_participants]
+DESIGNS = {}
 
-print("Evaluating...")
 # design (7, 7, 3, 3, 1)-BIBD, gives threshold of 2
 d_blocks = [[0, 1, 3], [0, 2, 6], [0, 4, 5], [1, 2, 4], [1, 5, 6], [2, 3, 5], [3, 4, 6]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("7,7,3,3,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"7,7,3,3,1": d_blocks})
 
-print("Evaluating...")
 # design (9, 12, 4, 3, 1)-BIBD
 d_blocks = [[0, 3, 6], [0, 4, 7], [2, 4, 6], [6, 7, 8], [0, 5, 8], [3, 4, 5], [2, 3, 8], [2, 5, 7], [1, 4, 8],
             [1, 3, 7], [0, 1, 2], [1, 5, 6]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("9,12,4,3,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"9,12,4,3,1": d_blocks})
 
-print("Evaluating...")
 # design (13, 13, 4, 4, 1)-BIBD
 d_blocks = [[0, 2, 4, 6], [6, 8, 10, 12], [6, 7, 9, 11], [0, 5, 8, 9], [4, 5, 10, 11], [0, 3, 11, 12], [3, 4, 7, 8],
             [2, 3, 9, 10], [1, 4, 9, 12], [2, 5, 7, 12], [1, 3, 5, 6], [1, 2, 8, 11], [0, 1, 7, 10]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("13,13,4,4,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"13,13,4,4,1": d_blocks})
 
-print("Evaluating...")
 # design (16, 20, 5, 4, 1)-BIBD
 d_blocks = [[0, 1, 13, 15], [2, 5, 11, 12], [3, 5, 10, 15], [9, 11, 14, 15], [9, 10, 12, 13], [0, 2, 6, 10],
             [0, 3, 8, 11], [7, 8, 10, 14], [6, 8, 12, 15], [0, 4, 12, 14], [0, 5, 7, 9], [6, 7, 11, 13], [4, 5, 8, 13],
             [3, 4, 6, 9], [2, 4, 7, 15], [2, 3, 13, 14], [1, 5, 6, 14], [1, 4, 10, 11], [1, 3, 7, 12], [1, 2, 8, 9]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("16,20,5,4,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"16,20,5,4,1": d_blocks})
 
-print("Evaluating...")
 # design (21, 21, 5, 5, 1)-BIBD
 d_blocks = [[2, 4, 7, 9, 10], [2, 5, 11, 16, 20], [0, 1, 10, 11, 12], [1, 9, 13, 16, 17], [3, 10, 13, 15, 20],
             [0, 9, 14, 19, 20], [1, 4, 8, 18, 20], [7, 8, 11, 13, 14], [1, 5, 7, 15, 19], [6, 8, 10, 16, 19],
             [6, 7, 12, 17, 20], [0, 4, 5, 6, 13], [3, 5, 8, 9, 12], [3, 4, 11, 17, 19], [1, 2, 3, 6, 14],
             [5, 10, 14, 17, 18], [2, 12, 13, 18, 19], [4, 12, 14, 15, 16], [6, 9, 11, 15, 18], [0, 3, 7, 16, 18],
             [0, 2, 8, 15, 17]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("21,21,5,5,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"21,21,5,5,1": d_blocks})
 
-print("Evaluating...")
 # design (25, 30, 6, 5, 1)-BIBD, gives threshold of 2 or 3 depending on base scheme and repairing degree d of 5
 d_blocks = [[9, 11, 16, 18, 21], [3, 10, 16, 19, 23], [5, 8, 10, 20, 22], [6, 15, 17, 18, 22], [3, 5, 7, 14, 18],
             [3, 6, 9, 20, 24], [0, 9, 10, 13, 17], [0, 11, 14, 19, 22], [2, 13, 18, 19, 20], [2, 4, 16, 22, 24],
@@ -199,11 +467,8 @@ d_blocks = [[9, 11, 16, 18, 21], [3, 10, 16, 19, 23], [5, 8, 10, 20, 22], [6, 15
             [2, 6, 7, 10, 11], [7, 8, 13, 15, 16], [7, 12, 17, 19, 24], [0, 5, 6, 12, 16], [4, 6, 13, 14, 23],
             [4, 5, 9, 15, 19], [3, 4, 8, 11, 17], [0, 4, 7, 20, 21], [3, 12, 13, 21, 22], [1, 6, 8, 19, 21],
             [1, 5, 11, 13, 24], [1, 4, 10, 12, 18], [0, 1, 2, 3, 15], [1, 7, 9, 22, 23], [1, 14, 16, 17, 20]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("25,30,6,5,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"25,30,6,5,1": d_blocks})
 
-print("Evaluating...")
 # design (31, 31, 6, 6, 1)-BIBD
 d_blocks = [[0, 5, 8, 24, 27, 28], [2, 6, 10, 15, 28, 29], [2, 3, 5, 9, 11, 20], [3, 6, 7, 19, 23, 27],
             [4, 6, 11, 17, 24, 25], [9, 12, 16, 19, 25, 28], [7, 9, 18, 24, 29, 30], [10, 13, 19, 20, 21, 24],
@@ -213,11 +478,8 @@ d_blocks = [[0, 5, 8, 24, 27, 28], [2, 6, 10, 15, 28, 29], [2, 3, 5, 9, 11, 20],
             [4, 5, 14, 19, 26, 29], [0, 4, 9, 15, 21, 23], [3, 4, 8, 10, 16, 18], [2, 4, 12, 13, 27, 30],
             [3, 14, 17, 21, 28, 30], [1, 6, 8, 9, 13, 14], [1, 5, 10, 23, 25, 30], [0, 1, 2, 17, 18, 19],
             [1, 4, 7, 20, 22, 28], [1, 3, 12, 15, 24, 26], [1, 11, 16, 21, 27, 29]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("31,31,6,6,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"31,31,6,6,1": d_blocks})
 
-print("Evaluating...")
 # design (36, 42, 7, 6, 1)-BIBD
 d_blocks = [[2, 4, 10, 12, 29, 35], [2, 5, 8, 24, 29, 35], [0, 3, 10, 13, 29, 35], [2, 6, 9, 13, 29, 35],
             [4, 17, 20, 24, 29, 35], [2, 7, 14, 17, 29, 35], [3, 6, 8, 14, 29, 35], [3, 7, 12, 16, 28, 34],
@@ -230,6 +492,37 @@ d_blocks = [[2, 4, 10, 12, 29, 35], [2, 5, 8, 24, 29, 35], [0, 3, 10, 13, 29, 35
             [3, 4, 11, 21, 26, 31], [2, 3, 18, 21, 25, 31], [1, 7, 10, 21, 25, 31], [1, 6, 12, 21, 25, 30],
             [1, 5, 16, 21, 25, 30], [0, 2, 16, 20, 24, 30], [1, 4, 13, 14, 25, 30], [1, 3, 9, 17, 25, 30],
             [0, 1, 8, 20, 24, 30], [1, 2, 11, 15, 25, 30]]
-data = evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list)
-data.to_csv("36,42,7,6,1-BIBD_results.csv", encoding='utf-8', index=False)
-print("Done.")
+DESIGNS.update({"36,42,7,6,1": d_blocks})
+
+
+"""
+Test algorithm
+"""
+avail_probs = [1, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1]
+fault_models_list = ["Permanent", "Transient"]
+num_repair_iterations = 1000
+repair_algos_list = [random_participants, stored_intersecting_participants, stored_grouped_participants]
+# Availability-aware algorithms, for evaluate_design only (no batched or exact counterparts)
+targeted_repair_algos_list = [greedy_cover_participants, adaptive_participants]
+REPAIR_ALGORITHMS = {repair_algo.__name__: repair_algo
+                     for repair_algo in repair_algos_list + targeted_repair_algos_list}
+
+if __name__ == "__main__":
+    # RTS_INSTRUMENT=1 adds a per-configuration instrumentation breakdown and a cProfile dump next to each CSV
+    instrument = bool(os.environ.get("RTS_INSTRUMENT"))
+    # RTS_CHECKPOINT=1 keeps the finished configurations of each design in a checkpoint until the design is done, so
+    # a rerun after a crash only does what is left
+    use_checkpoint = bool(os.environ.get("RTS_CHECKPOINT"))
+    instrumentation.enable(instrument)
+    for name, d_blocks in DESIGNS.items():
+        print("Evaluating...")
+        checkpoint_log = CheckpointLog(name + "-BIBD_results.checkpoint") if use_checkpoint else None
+        with ResultsSink(RESULT_COLUMNS, name + "-BIBD_results.csv") as sink, \
+                instrumentation.profiled(name + "-BIBD_results.prof" if instrument else None):
+            evaluate_design(d_blocks, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list, sink,
+                            checkpoint=checkpoint_log)
+        if checkpoint_log is not None:
+            checkpoint_log.discard()
+        if instrument:
+            instrumentation.write_breakdown(name + "-BIBD_results.instrumentation.csv")
+        print("Done.")
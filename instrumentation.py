@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+
+import contextlib
+import time
+
+# Hot sections check this flag before touching the counters, so instrumentation disabled costs one attribute lookup
+ENABLED = False
+
+BREAKDOWN_LABELS = ['Algorithm', 'Fault model', 'Availability probability']
+
+counters = {}
+timers = {}
+_breakdown = []
+
+
+def enable(enabled=True):
+    """
+    Turn instrumentation on or off, starting from empty counters and timers
+    """
+    global ENABLED
+    ENABLED = enabled
+    reset()
+    _breakdown.clear()
+
+
+def count(name, n=1):
+    """
+    Add n to a named counter
+    """
+    counters.update({name: counters.get(name, 0) + n})
+
+
+def add_time(name, seconds):
+    """
+    Add seconds to a named timer
+    """
+    timers.update({name: timers.get(name, 0.0) + seconds})
+
+
+class timed:
+    "Context manager adding the wall clock time of its block to a named timer, when instrumentation is enabled."
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is not None:
+            add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def reset():
+    "Clear the counters and timers"
+    counters.clear()
+    timers.clear()
+
+
+def snapshot():
+    """
+    :return: dict of every counter, and of every timer as "<name> time" in seconds
+    """
+    values = dict(counters)
+    values.update({name + ' time': seconds for name, seconds in timers.items()})
+    return values
+
+
+def record(algorithm_name, fault_model=None, prob=None):
+    """
+    Close the breakdown of one configuration: keep a snapshot of the counters and timers labelled with it, and start
+    the next configuration from zero. Does nothing when disabled.
+    """
+    if not ENABLED:
+        return
+    row = {'Algorithm': algorithm_name, 'Fault model': fault_model, 'Availability probability': prob}
+    row.update(snapshot())
+    _breakdown.append(row)
+    reset()
+
+
+def breakdown():
+    """
+    :return: list of the per-configuration rows recorded so far
+    """
+    return list(_breakdown)
+
+
+def write_breakdown(path):
+    """
+    Write the per-configuration breakdown to a CSV file and forget it
+    :param path: CSV file, replaced if it exists
+    """
+    from results import ResultsSink
+    names = sorted({name for row in _breakdown for name in row if name not in BREAKDOWN_LABELS})
+    with ResultsSink(BREAKDOWN_LABELS + names, path) as sink:
+        for row in _breakdown:
+            sink.append(row)
+    _breakdown.clear()
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """
+    Run the block under cProfile and dump its pstats to path; without a path the block just runs
+    :param path: pstats file, or None
+    """
+    if path is None:
+        yield
+        return
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
@@ -1,19 +1,128 @@
 #!/usr/bin/python3
 
+import numpy as np
+
 
 class Participant:
     "Participant class for use in evaluating the repairable threshold algorithms."
-    participant_count = 0
 
     def __init__(self, id_num, shares):
         self.id_num = id_num
         self.shares = shares
         self.intersecting_participants = []  # This is the set R from algorithm 2
         self.grouped_participants = {}  # This is the set R from algorithm 3
-        Participant.participant_count += 1
 
 
     def import_participants(design):
         participant_dic = {}
         # depends on how we encode the designs
         return participant_dic
+
+
+class ParticipantStore:
+    """
+    Struct-of-arrays store of all participants of a design: their shares, intersecting participants and the holders
+    of every share as CSR int32 arrays, plus the per-trial set of participants that may still be contacted. That set
+    is the prefix order[:live] of a permutation of the ids, so removing a participant, sampling one and resetting the
+    set for the next trial need no copies.
+    """
+
+    def __init__(self, design):
+        """
+        :param design: Design
+        """
+        self.num_participants = design.num_participants
+        self.share_ptr = design.block_ptr
+        self.shares = design.block_shares
+        self.neighbour_ptr, self.neighbours, _ = design.intersections()
+        self.holder_ptr = design.holder_ptr
+        self.holders = design.holders
+
+        self.order = np.arange(self.num_participants, dtype=np.int32)
+        self.position = np.arange(self.num_participants, dtype=np.int32)  # inverse permutation of order
+        self.live = self.num_participants
+
+    def participant_shares(self, i):
+        """
+        :param i: participant id
+        :return: array of the shares held by participant i
+        """
+        return self.shares[self.share_ptr[i]:self.share_ptr[i + 1]]
+
+    def intersecting_participants(self, i):
+        """
+        :param i: participant id
+        :return: array of the participants sharing at least one share with participant i
+        """
+        return self.neighbours[self.neighbour_ptr[i]:self.neighbour_ptr[i + 1]]
+
+    def share_holders(self, s):
+        """
+        :param s: share id
+        :return: array of the participants holding share s
+        """
+        return self.holders[self.holder_ptr[s]:self.holder_ptr[s + 1]]
+
+    def new_trial(self, failed):
+        """
+        Make every participant but the failed one contactable again
+        :param failed: id of the participant to repair
+        :return: ParticipantView of the failed participant
+        """
+        self.live = self.num_participants
+        self.remove(failed)
+        return ParticipantView(self, failed)
+
+    def remove(self, i):
+        """
+        Stop considering participant i for the rest of the trial, by swapping it past the end of the live prefix
+        :param i: contactable participant id
+        """
+        last = self.live - 1
+        p, j = self.position[i], self.order[last]
+        self.order[p], self.order[last] = j, i
+        self.position[j], self.position[i] = p, last
+        self.live = last
+
+    def sample(self):
+        """
+        :return: id of a uniformly chosen contactable participant
+        """
+        return int(self.order[np.random.randint(self.live)])
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, i):
+        return self.position[i] < self.live
+
+    def __iter__(self):
+        return iter(self.order[:self.live].tolist())
+
+    def __getitem__(self, i):
+        return ParticipantView(self, i)
+
+
+class ParticipantView:
+    "Read-only stand-in for a Participant, backed by one row of a ParticipantStore."
+    __slots__ = ("store", "id_num")
+
+    def __init__(self, store, id_num):
+        self.store = store
+        self.id_num = id_num
+
+    @property
+    def shares(self):
+        return self.store.participant_shares(self.id_num).tolist()
+
+    @property
+    def intersecting_participants(self):
+        return self.store.intersecting_participants(self.id_num).tolist()
+
+    @property
+    def grouped_participants(self):
+        groups = {}
+        for s in self.shares:
+            holders = self.store.share_holders(s)
+            groups.update({s: holders[holders != self.id_num].tolist()})
+        return groups
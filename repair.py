@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 
-from participant import Participant
+from participant import Participant, ParticipantStore
+import instrumentation
 import numpy as np
 
 
@@ -11,22 +12,31 @@ def get_intersecting_shares(missing_shares, available_shares):
     :param available_shares
     :return: list of intersecting shares
     """
+    if instrumentation.ENABLED:
+        instrumentation.count('intersection checks')
     return list(set(missing_shares).intersection(set(available_shares)))
 
 
 def random_participants(participant_dic, failed_participant, p_available, fault="Transient"):
     """
     Algorithm 1: Random Participants
-    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self)
+    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self),
+    or a ParticipantStore after new_trial(failed_participant)
     :param failed_participant: the participant object whose share is being repaired
-    :param p_available: availability probability
+    :param p_available: availability probability, or array of the availability probability of every participant
     :param fault: the fault model to be used {"Permanent", "Transient"}
     :return: Boolean (whether repair was successful) and int (# of steps taken to repair aka # participants contacted)
     """
     faults = ["Permanent", "Transient"]
     assert fault in faults
+    if isinstance(participant_dic, ParticipantStore):
+        return _random_participants_store(participant_dic, failed_participant, p_available, fault)
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
 
     missing_shares = failed_participant.shares.copy()
+    if instrumented:
+        instrumentation.count('copied items', len(missing_shares))
 
     steps = 0
     repaired = False
@@ -36,12 +46,16 @@ def random_participants(participant_dic, failed_participant, p_available, fault=
         P = participant_dic[P_id]
 
         steps += 1
+        if instrumented:
+            instrumentation.count('copied items', len(participant_dic))  # the list of ids the choice is made from
+            instrumentation.count('candidate draws')
+            instrumentation.count('availability draws')
         # See if the participant is available
         if fault == "Transient":
-            if np.random.random_sample() > p_available:
+            if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                 continue
         elif fault == "Permanent":
-            if np.random.random_sample() > p_available:
+            if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                 participant_dic.pop(P_id)  # remove from the dict and don't consider contacting again
                 if not participant_dic:  # if there are no more participants to try contacting, repair has failed
                     return False, steps
@@ -61,17 +75,24 @@ def random_participants(participant_dic, failed_participant, p_available, fault=
 def stored_intersecting_participants(participant_dic, failed_participant, p_available, fault="Transient"):
     """
     Algorithm 2: Stored Intersecting Participants
-    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self)
+    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self),
+    or a ParticipantStore after new_trial(failed_participant)
     :param failed_participant: the participant object whose share is being repaired
-    :param p_available: availability probability
+    :param p_available: availability probability, or array of the availability probability of every participant
     :param fault: the fault model to be used {"Permanent", "Transient"}
     :return: Boolean (whether repair was successful) and int (# of steps taken to repair aka # participants contacted)
     """
     faults = ["Permanent", "Transient"]
     assert fault in faults
+    if isinstance(participant_dic, ParticipantStore):
+        return _stored_intersecting_participants_store(participant_dic, failed_participant, p_available, fault)
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
 
     missing_shares = failed_participant.shares.copy()
     intersecting_participants = failed_participant.intersecting_participants.copy()
+    if instrumented:
+        instrumentation.count('copied items', len(missing_shares) + len(intersecting_participants))
 
     steps = 0
     repaired = False
@@ -81,12 +102,15 @@ def stored_intersecting_participants(participant_dic, failed_participant, p_avai
         P = participant_dic[P_id]
 
         steps += 1
+        if instrumented:
+            instrumentation.count('candidate draws')
+            instrumentation.count('availability draws')
         # See if the participant is available
         if fault == "Transient":
-            if np.random.random_sample() > p_available:
+            if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                 continue
         elif fault == "Permanent":
-            if np.random.random_sample() > p_available:
+            if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                 intersecting_participants.remove(P_id)  # remove from the list and don't consider contacting again
                 if not intersecting_participants:  # if no more participants to try contacting, repair has failed
                     return False, steps
@@ -106,34 +130,46 @@ def stored_intersecting_participants(participant_dic, failed_participant, p_avai
 def stored_grouped_participants(participant_dic, failed_participant, p_available, fault="Transient"):
     """
     Algorithm 3: Stored Grouped Participants
-    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self)
+    :param participant_dic: the dictionary of participants with failed_participant removed (as to not contact self),
+    or a ParticipantStore after new_trial(failed_participant)
     :param failed_participant: the participant object whose share is being repaired
-    :param p_available: availability probability
+    :param p_available: availability probability, or array of the availability probability of every participant
     :param fault: the fault model to be used {"Permanent", "Transient"}
     :return: Boolean (whether repair was successful) and int (# of steps taken to repair aka # participants contacted)
     """
     faults = ["Permanent", "Transient"]
     assert fault in faults
+    if isinstance(participant_dic, ParticipantStore):
+        return _stored_grouped_participants_store(participant_dic, failed_participant, p_available, fault)
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
 
     missing_shares = failed_participant.shares.copy()
     grouped_participants = failed_participant.grouped_participants.copy()
+    if instrumented:
+        instrumentation.count('copied items', len(missing_shares) + len(grouped_participants))
 
     steps = 0
     for s in missing_shares:
         repaired = False
         s_repair_candidates = grouped_participants.get(s).copy()
+        if instrumented:
+            instrumentation.count('copied items', len(s_repair_candidates))
 
         while not repaired and s_repair_candidates:
             # Select random participant from the set of repair candidates for this subshare s:
             P_id = np.random.choice(s_repair_candidates)
 
             steps += 1
+            if instrumented:
+                instrumentation.count('candidate draws')
+                instrumentation.count('availability draws')
             # See if the participant is available
             if fault == "Transient":
-                if np.random.random_sample() > p_available:
+                if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                     continue
             elif fault == "Permanent":
-                if np.random.random_sample() > p_available:
+                if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
                     s_repair_candidates.remove(P_id)  # remove from the list and don't consider contacting again
                     continue
 
@@ -144,3 +180,225 @@ def stored_grouped_participants(participant_dic, failed_participant, p_available
             return False, steps
 
     return True, steps
+
+
+
+class AvailabilityEstimator:
+    "Cached availability estimate of each helper: an exponentially decaying average of the outcomes of its contacts."
+
+    def __init__(self, decay=0.1, prior=1.0):
+        """
+        :param decay: weight of the newest outcome, older ones fade by a factor 1 - decay per contact
+        :param prior: estimate of a helper never contacted; 1 makes untried helpers go first
+        """
+        self.decay = decay
+        self.prior = prior
+        self.estimates = {}
+
+    def estimate(self, participant_id):
+        return self.estimates.get(participant_id, self.prior)
+
+    def update(self, participant_id, available):
+        """
+        :param participant_id: contacted helper
+        :param available: whether it answered
+        """
+        estimate = self.estimate(participant_id)
+        self.estimates.update({participant_id: estimate + self.decay * (available - estimate)})
+
+    def reset(self):
+        "Forget every estimate, e.g. between two configurations"
+        self.estimates.clear()
+
+
+# Estimator used by adaptive_participants, reset by evaluate_design at the start of each configuration
+availability_estimator = AvailabilityEstimator()
+
+
+def _targeted_repair(failed_participant, p_available, fault, choose, observe=None):
+    """
+    Repair contacting only helpers that hold a still missing share, found from the grouped participants
+    :param choose: function of the cover dict (helper -> set of missing shares it holds) returning the next helper
+    :param observe: function called with each contacted helper and whether it was available
+    """
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
+    missing_shares = failed_participant.shares.copy()
+    grouped_participants = failed_participant.grouped_participants
+    holders = {s: set(grouped_participants.get(s)) for s in missing_shares}
+    cover = {}
+    for s in missing_shares:
+        for P_id in holders[s]:
+            cover.update({P_id: cover.get(P_id, set()) | {s}})
+
+    steps = 0
+    while missing_shares:
+        # A missing share nobody is left to give cannot be repaired
+        if not all(holders[s] for s in missing_shares):
+            return False, steps
+        P_id = choose(cover)
+
+        steps += 1
+        if instrumented:
+            instrumentation.count('availability draws')
+        available = np.random.random_sample() <= (p_available[P_id] if per_helper else p_available)
+        if observe:
+            observe(P_id, available)
+        if not available:
+            if fault == "Permanent":
+                for s in cover.pop(P_id):
+                    holders[s].discard(P_id)  # don't consider contacting again
+            continue
+
+        # The helper gives one of the missing shares it holds, as in the other algorithms
+        s = get_intersecting_shares(missing_shares, cover[P_id])[0]
+        missing_shares.remove(s)
+        for holder in holders.pop(s):
+            cover[holder].discard(s)
+            if not cover[holder]:
+                cover.pop(holder)
+    return True, steps
+
+
+def _choose_among_best(cover, key):
+    best = max(key(P_id) for P_id in cover)
+    ties = [P_id for P_id in cover if key(P_id) == best]
+    return ties[np.random.randint(len(ties))]
+
+
+def greedy_cover_participants(participant_dic, failed_participant, p_available, fault="Transient"):
+    """
+    Algorithm 4: Greedy Cover. Always contacts a helper holding the most still missing shares (chosen at random among
+    ties), so as few helpers as possible cover the failed participant's shares, and gives up as soon as a missing
+    share has no helper left.
+    :param participant_dic: not used, the helpers come from failed_participant.grouped_participants
+    :param failed_participant: the participant object whose share is being repaired
+    :param p_available: availability probability, or array of the availability probability of every participant
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :return: Boolean (whether repair was successful) and int (# of steps taken to repair aka # participants contacted)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+
+    return _targeted_repair(failed_participant, p_available, fault,
+                            lambda cover: _choose_among_best(cover, lambda P_id: len(cover[P_id])))
+
+
+def adaptive_participants(participant_dic, failed_participant, p_available, fault="Transient",
+                          estimator=None):
+    """
+    Algorithm 5: Adaptive. Contacts the helper holding a still missing share with the highest estimated availability
+    (then the most missing shares, then at random), and updates the estimate with the outcome of each contact. The
+    estimates persist from one repair to the next.
+    :param participant_dic: not used, the helpers come from failed_participant.grouped_participants
+    :param failed_participant: the participant object whose share is being repaired
+    :param p_available: availability probability, or array of the availability probability of every participant
+    :param fault: the fault model to be used {"Permanent", "Transient"}
+    :param estimator: AvailabilityEstimator to use, availability_estimator by default
+    :return: Boolean (whether repair was successful) and int (# of steps taken to repair aka # participants contacted)
+    """
+    faults = ["Permanent", "Transient"]
+    assert fault in faults
+    estimator = availability_estimator if estimator is None else estimator
+
+    return _targeted_repair(failed_participant, p_available, fault,
+                            lambda cover: _choose_among_best(cover, lambda P_id: (estimator.estimate(P_id),
+                                                                                  len(cover[P_id]))),
+                            estimator.update)
+
+
+# The same algorithms on a ParticipantStore: candidates are sampled by index and dropped by swap-remove, so a trial
+# never copies the participants
+
+
+def _random_participants_store(store, failed_participant, p_available, fault):
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
+    missing_shares = failed_participant.shares
+    steps = 0
+    while True:
+        P_id = store.sample()
+
+        steps += 1
+        if instrumented:
+            instrumentation.count('candidate draws')
+            instrumentation.count('availability draws')
+        if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
+            if fault == "Permanent":
+                store.remove(P_id)
+                if not len(store):
+                    return False, steps
+            continue
+
+        shares = get_intersecting_shares(missing_shares, store.participant_shares(P_id).tolist())
+        if shares:
+            missing_shares.remove(shares[0])
+        if not missing_shares:
+            return True, steps
+
+
+def _stored_intersecting_participants_store(store, failed_participant, p_available, fault):
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
+    missing_shares = failed_participant.shares
+    candidates = store.intersecting_participants(failed_participant.id_num).tolist()
+    live = len(candidates)
+    if instrumented:
+        instrumentation.count('copied items', live)
+    steps = 0
+    while True:
+        j = np.random.randint(live)
+        P_id = candidates[j]
+
+        steps += 1
+        if instrumented:
+            instrumentation.count('candidate draws')
+            instrumentation.count('availability draws')
+        if np.random.random_sample() > (p_available[P_id] if per_helper else p_available):
+            if fault == "Permanent":
+                live -= 1
+                candidates[j] = candidates[live]
+                if not live:
+                    return False, steps
+            continue
+
+        shares = get_intersecting_shares(missing_shares, store.participant_shares(P_id).tolist())
+        if shares:
+            missing_shares.remove(shares[0])
+        if not missing_shares:
+            return True, steps
+
+
+def _stored_grouped_participants_store(store, failed_participant, p_available, fault):
+    # With a single availability probability only the number of candidates left matters, not which ones they are
+    instrumented = instrumentation.ENABLED
+    per_helper = isinstance(p_available, np.ndarray)
+    steps = 0
+    for s in failed_participant.shares:
+        if per_helper:
+            candidates = [P_id for P_id in store.share_holders(s).tolist() if P_id != failed_participant.id_num]
+            if instrumented:
+                instrumentation.count('copied items', len(candidates))
+        remaining = len(store.share_holders(s)) - 1  # every holder but the failed participant
+        repaired = False
+        while not repaired and remaining:
+            steps += 1
+            if instrumented:
+                instrumentation.count('availability draws')
+            if per_helper:
+                j = np.random.randint(remaining)
+                available = np.random.random_sample() <= p_available[candidates[j]]
+            else:
+                available = np.random.random_sample() <= p_available
+            if not available:
+                if fault == "Permanent":
+                    remaining -= 1
+                    if per_helper:
+                        candidates[j] = candidates[remaining]
+                continue
+            repaired = True
+
+        if not repaired:
+            return False, steps
+
+    return True, steps
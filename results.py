@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+import csv
+import os
+import shutil
+
+
+class ResultsSink:
+    """
+    Collects result rows column by column and appends them to a CSV file, or to a directory of Parquet files, every
+    chunk_rows rows, by default as soon as each configuration finishes. Only the current chunk is held in memory.
+    Without a path the sink keeps every row in memory, for small runs returning a dataframe.
+
+    Unless appending, the rows go to path + ".partial" and close moves that over path, so the results of an earlier
+    run are only replaced by a complete set. An interrupted run leaves them untouched, with the rows it finished in
+    the .partial file.
+    """
+
+    def __init__(self, columns, path=None, chunk_rows=1, file_format=None, append=False):
+        """
+        :param columns: column names, in output order
+        :param path: CSV file or Parquet directory to write to, None to keep the rows in memory
+        :param chunk_rows: number of rows buffered before they are written out
+        :param file_format: "csv" or "parquet", guessed from the path extension if None
+        :param append: add to the results already at path instead of replacing them
+        """
+        self.columns = list(columns)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        if file_format is None and path is not None:
+            file_format = "parquet" if os.path.splitext(path)[1] == ".parquet" else "csv"
+        assert file_format in [None, "csv", "parquet"]
+        self.file_format = file_format
+        self.write_path = path
+        if path is not None and not append:
+            self.write_path = path + ".partial"
+            if os.path.isdir(self.write_path):
+                shutil.rmtree(self.write_path)
+            elif os.path.exists(self.write_path):
+                os.remove(self.write_path)
+
+        self.buffer = {column: [] for column in self.columns}
+        self.buffered_rows = 0
+        self.rows_written = 0
+        self.parts_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.flush()  # keep whatever was finished in the .partial file
+        return False
+
+    def append(self, row):
+        """
+        Add one result row, flushing the buffer once it holds chunk_rows rows
+        :param row: dict of column -> value, missing columns are left empty
+        """
+        unknown = set(row) - set(self.buffer)
+        if unknown:
+            raise KeyError("Unknown result columns: %s" % sorted(unknown))
+        for column, values in self.buffer.items():
+            values.append(row.get(column))
+        self.buffered_rows += 1
+        if self.path is not None and self.buffered_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        "Write the buffered rows out. Does nothing for an in-memory sink."
+        if self.path is None or not self.buffered_rows:
+            return
+        if self.file_format == "csv":
+            self._write_csv()
+        else:
+            self._write_parquet()
+        self.rows_written += self.buffered_rows
+        self.buffer = {column: [] for column in self.columns}
+        self.buffered_rows = 0
+
+    def close(self):
+        "Write the buffered rows out and move the fresh results over path. Later rows are appended to path."
+        self.flush()
+        if self.write_path == self.path:
+            return
+        if self.file_format == "csv":
+            if not os.path.exists(self.write_path):
+                self._write_csv()  # no rows, still leave the header
+            os.replace(self.write_path, self.path)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            for part in os.listdir(self.path):
+                if part.startswith("part-") and part.endswith(".parquet"):
+                    os.remove(os.path.join(self.path, part))
+            if os.path.isdir(self.write_path):
+                for part in sorted(os.listdir(self.write_path)):
+                    os.replace(os.path.join(self.write_path, part), os.path.join(self.path, part))
+                os.rmdir(self.write_path)
+        self.write_path = self.path
+
+    def _write_csv(self):
+        new_file = not os.path.exists(self.write_path) or os.path.getsize(self.write_path) == 0
+        with open(self.write_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(self.columns)
+            writer.writerows(zip(*(["" if value is None else value for value in self.buffer[column]]
+                                   for column in self.columns)))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet results needs pyarrow, use a .csv path instead")
+        os.makedirs(self.write_path, exist_ok=True)
+        # Each chunk is its own file, so everything flushed stays readable if the run dies
+        while os.path.exists(os.path.join(self.write_path, "part-%05d.parquet" % self.parts_written)):
+            self.parts_written += 1
+        table = pa.table({column: self.buffer[column] for column in self.columns})
+        pq.write_table(table, os.path.join(self.write_path, "part-%05d.parquet" % self.parts_written))
+        self.parts_written += 1
+
+    def to_dataframe(self):
+        """
+        :return: dataframe of the rows of an in-memory sink, or of everything written so far for a file sink
+        """
+        import pandas as pd
+        if self.path is None:
+            return pd.DataFrame(self.buffer, columns=self.columns)
+        self.flush()
+        if self.file_format == "csv":
+            return pd.read_csv(self.write_path)
+        return pd.read_parquet(self.write_path)
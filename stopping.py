@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+from statistics import NormalDist
+import math
+import numpy as np
+
+
+class RunningStats:
+    "Online mean and variance (Welford), updated one value at a time or a whole array at a time."
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_many(self, values):
+        """
+        Merge in the statistics of an array of values (Chan et al.'s pairwise update)
+        :param values: array of values
+        """
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return
+        count = self.count + values.size
+        batch_mean = values.mean()
+        delta = batch_mean - self.mean
+        self.m2 += ((values - batch_mean) ** 2).sum() + delta * delta * self.count * values.size / count
+        self.mean += delta * values.size / count
+        self.count = count
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def half_width(self, z):
+        """
+        :param z: standard normal quantile of the confidence level
+        :return: half-width of the normal confidence interval of the mean
+        """
+        return z * math.sqrt(self.variance() / self.count) if self.count else math.inf
+
+
+def z_value(confidence):
+    """
+    :param confidence: two-sided confidence level, e.g. 0.95
+    :return: matching standard normal quantile
+    """
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+MIN_SUCCESSES = 10  # successful repairs needed before the intervals are trusted
+
+
+def wilson_interval(successes, n, z):
+    """
+    Wilson score interval of a proportion, which keeps a positive width when no or every trial succeeded
+    :param successes: number of successes
+    :param n: number of trials
+    :param z: standard normal quantile of the confidence level
+    :return: centre and half-width of the interval
+    """
+    if not n:
+        return 0.5, math.inf
+    proportion = successes / n
+    denominator = 1 + z * z / n
+    centre = (proportion + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(proportion * (1 - proportion) / n + z * z / (4 * n * n)) / denominator
+    return centre, half_width
+
+
+def converged(outcome_stats, contacted_stats, tolerance, z, min_successes=MIN_SUCCESSES):
+    """
+    :param outcome_stats: RunningStats of the repair outcomes, 1 for a success and 0 for a failure
+    :param contacted_stats: RunningStats of the participants contacted by the successful repairs
+    :param tolerance: largest allowed confidence interval half-width, relative to its centre
+    :param z: standard normal quantile of the confidence level
+    :param min_successes: successful repairs needed before anything converges
+    :return: whether there are min_successes successful repairs, and the Wilson interval of the success rate and the
+    normal interval of the success average contacted are both within tolerance
+    """
+    successes = contacted_stats.count
+    if successes < min_successes:
+        return False
+    centre, half_width = wilson_interval(successes, outcome_stats.count, z)
+    return half_width <= tolerance * centre and \
+        contacted_stats.half_width(z) <= tolerance * abs(contacted_stats.mean)
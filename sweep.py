@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+
+from batch_repair import BatchTables, BATCH_ALGORITHMS, simulate_repairs
+from design import Design
+from results import ResultsSink
+from distributions import new_histograms, distribution_results
+from experiment import RESULT_COLUMNS, DESIGNS, avail_probs, fault_models_list, num_repair_iterations, \
+    repair_algos_list, repair_results, result_columns
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import time
+
+_worker_designs = {}
+_worker_tables = {}
+
+
+def _init_worker(designs):
+    """
+    Process pool initializer: keep the designs in the worker, so tasks only carry their name
+    :param designs: dict of design name -> blocks or Design
+    """
+    _worker_designs.clear()
+    _worker_designs.update(designs)
+    _worker_tables.clear()
+
+
+def _run_task(task):
+    """
+    Simulate one chunk of repairs of one (design, algorithm, fault model, availability probability) cell
+    :param task: tuple (cell, design name, algorithm, fault model, availability probability, iterations, root seed,
+    spawn key of the chunk's seed, whether to record distributions)
+    :return: cell, its partial tallies and its partial histograms (None unless recording distributions)
+    """
+    cell, name, repair_algo, fault_model, prob, num_iterations, seed, spawn_key, distributions = task
+    if name not in _worker_tables:
+        design = _worker_designs[name]
+        _worker_tables.update({name: BatchTables(design if isinstance(design, Design) else Design(design))})
+
+    start_wall_time = time.perf_counter()
+    start_process_time = time.process_time()
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+    failed_repairs = 0
+    total_success_contacted = 0
+    total_failed_contacted = 0
+    histograms = new_histograms() if distributions else None
+    for success, steps in simulate_repairs(_worker_tables[name], BATCH_ALGORITHMS[repair_algo], prob, fault_model,
+                                           num_iterations, rng):
+        failed_repairs += int(np.count_nonzero(~success))
+        total_success_contacted += int(steps[success].sum())
+        total_failed_contacted += int(steps[~success].sum())
+        if histograms:
+            histograms['Success contacted'].add_many(steps[success])
+            histograms['Fail contacted'].add_many(steps[~success])
+    tally = np.array([failed_repairs, total_success_contacted, total_failed_contacted,
+                      time.perf_counter() - start_wall_time, time.process_time() - start_process_time])
+    return cell, tally, histograms
+
+
+def sweep_tasks(designs, availability_probs, fault_models, num_iterations, repair_algorithms, seed, chunk_size,
+                distributions=False):
+    """
+    Split every (design, algorithm, fault model, availability probability) cell into chunks of at most chunk_size
+    repairs. Each chunk gets its own seed, spawned from seed and the chunk's position in the grid, so the results
+    only depend on seed and chunk_size and not on how many workers run the chunks. The tasks are generated one at a
+    time and only carry the spawn key, the SeedSequence is built by the worker.
+    :return: generator of the tasks for _run_task, cell by cell
+    """
+    for d, name in enumerate(designs):
+        for a, repair_algo in enumerate(repair_algorithms):
+            for f, fault_model in enumerate(fault_models):
+                for p, prob in enumerate(availability_probs):
+                    cell = (name, repair_algo.__name__, fault_model, prob)
+                    for c, start in enumerate(range(0, num_iterations, chunk_size)):
+                        yield (cell, name, repair_algo, fault_model, prob, min(chunk_size, num_iterations - start),
+                               seed, (d, a, f, p, c), distributions)
+
+
+def run_sweep(designs, availability_probs, fault_models, num_iterations, repair_algorithms, seed=0, max_workers=None,
+              chunk_size=100000, sinks=None, distributions=False):
+    """
+    Evaluate every design with the batched algorithms, spreading the work over a process pool
+    :param designs: dict of design name -> blocks or Design
+    :param availability_probs: list of availability probabilities
+    :param fault_models: list of fault models {"Permanent", "Transient"}
+    :param num_iterations: number of repairs per (design, algorithm, fault model, availability probability) cell
+    :param repair_algorithms: list of repair algorithms from repair.py
+    :param seed: root seed of the sweep
+    :param max_workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: maximum number of repairs per task
+    :param sinks: dict of design name -> ResultsSink to stream each finished cell to, by default the rows are
+    collected in memory
+    :param distributions: also record the distribution of participants contacted, adding DISTRIBUTION_COLUMNS
+    :return: dict of design name -> results dataframe with the columns of evaluate_design, or the sinks if given
+    """
+    tasks = sweep_tasks(designs, availability_probs, fault_models, num_iterations, repair_algorithms, seed,
+                        chunk_size, distributions)
+    columns = result_columns(distributions)
+    results_sinks = {name: ResultsSink(columns) for name in designs} if sinks is None else sinks
+
+    # Sum the partial tallies of each cell and write its row once its last chunk is in. Tasks come back in order,
+    # so the rows do too.
+    cell_chunks = -(-num_iterations // chunk_size)
+    num_tasks = len(designs) * len(repair_algorithms) * len(fault_models) * len(availability_probs) * cell_chunks
+    remaining = {}
+    tallies = {}
+    cell_histograms = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(designs,)) as pool:
+        for cell, tally, histograms in pool.map(_run_task, tasks, chunksize=max(1, num_tasks // 256)):
+            tallies.update({cell: tallies.get(cell, 0) + tally})
+            if histograms:
+                if cell in cell_histograms:
+                    for measure, histogram in histograms.items():
+                        cell_histograms[cell][measure].merge(histogram)
+                else:
+                    cell_histograms.update({cell: histograms})
+            remaining.update({cell: remaining.get(cell, cell_chunks) - 1})
+            if remaining[cell]:
+                continue
+            del remaining[cell]
+
+            name, algorithm_name, fault_model, prob = cell
+            failed_repairs, total_success_contacted, total_failed_contacted, wall_time, process_time = tallies.pop(cell)
+            success_share = (num_iterations - failed_repairs) / num_iterations
+            results = repair_results(algorithm_name, fault_model, prob, num_iterations, int(failed_repairs),
+                                     int(total_success_contacted), wall_time * success_share,
+                                     process_time * success_share, int(total_failed_contacted),
+                                     wall_time * (1 - success_share), process_time * (1 - success_share))
+            if distributions:
+                results.update(distribution_results(cell_histograms.pop(cell)))
+            results_sinks[name].append(results)
+
+    if sinks is not None:
+        return sinks
+    return {name: sink.to_dataframe() for name, sink in results_sinks.items()}
+
+
+if __name__ == "__main__":
+    print("Evaluating...")
+    sinks = {name: ResultsSink(RESULT_COLUMNS, name + "-BIBD_results.csv") for name in DESIGNS}
+    run_sweep(DESIGNS, avail_probs, fault_models_list, num_repair_iterations, repair_algos_list, sinks=sinks)
+    for sink in sinks.values():
+        sink.close()
+    print("Done.")